@@ -0,0 +1,125 @@
+import bisect
+import time
+
+import seaborn as sns
+
+
+class MonthlyCategoryChart:
+    """Grouped bar chart of running per-(month, category) totals drawn on an existing Axes.
+
+    Totals are kept in whole pennies and only converted to pounds for the bar heights.
+    """
+
+    def __init__(self, ax, categories):
+        self.ax = ax
+        self.categories = list(categories)
+        self.colours = dict(zip(self.categories, sns.color_palette(n_colors=len(self.categories))))
+        self.totals = {}
+        self.months = []
+        self.bars = {}
+        self.containers = []
+        self.changed = set()
+        self.layout_changed = True
+
+    def reset(self):
+        """Forget all totals"""
+        self.totals.clear()
+        self.months.clear()
+        self.changed.clear()
+        self.layout_changed = True
+
+    def add(self, date, category, pennies):
+        """Add a categorized transaction to the running totals"""
+        month = str(date)[:7]
+        key = (month, category)
+        if key not in self.totals:
+            self.totals[key] = 0
+            self.layout_changed = True
+            if month not in self.months:
+                bisect.insort(self.months, month)
+        self.totals[key] += int(pennies)
+        self.changed.add(key)
+
+    def remove(self, date, category, pennies):
+        """Take a transaction back out of the running totals"""
+        self.add(date, category, -int(pennies))
+
+    def redraw(self):
+        """Bring the bars up to date, returning True if the layout was rebuilt"""
+        rebuilt = self.layout_changed
+        if rebuilt:
+            self.rebuild_bars()
+        else:
+            # Only heights changed, so update the existing bars in place
+            for key in self.changed:
+                self.bars[key].set_height(self.totals[key] / 100)
+        self.changed.clear()
+        self.ax.relim()
+        self.ax.autoscale_view()
+        return rebuilt
+
+    def rebuild_bars(self):
+        """Recreate the bar artists after a month or category first appears"""
+        for container in self.containers:
+            container.remove()
+        self.containers = []
+        self.bars = {}
+        legend = self.ax.get_legend()
+        if legend is not None:
+            legend.remove()
+
+        present = [c for c in self.categories if any((m, c) in self.totals for m in self.months)]
+        width = 0.8 / max(len(present), 1)
+        for i, category in enumerate(present):
+            offset = (i - (len(present) - 1) / 2) * width
+            keys = [(month, category) for month in self.months]
+            container = self.ax.bar(
+                [x + offset for x in range(len(self.months))],
+                [self.totals.get(key, 0) / 100 for key in keys],
+                width,
+                label=category,
+                color=self.colours[category]
+            )
+            self.containers.append(container)
+            self.bars.update(zip(keys, container.patches))
+
+        self.ax.set_xticks(range(len(self.months)))
+        self.ax.set_xticklabels(self.months, rotation=45)
+        if present:
+            self.ax.legend()
+        self.ax.set_title('Monthly Income/Expenses')
+        self.ax.set_xlabel('Month')
+        self.ax.set_ylabel('Amount (£)')
+        self.layout_changed = False
+
+
+class RedrawScheduler:
+    """Merges bursts of redraw requests into one render, at most max_fps times a second"""
+
+    def __init__(self, root, render, max_fps=10):
+        self.root = root
+        self.render = render
+        self.min_interval = 1.0 / max_fps
+        self.pending = None
+        self.last_render = 0.0
+
+    def request(self):
+        """Schedule a render unless one is already pending"""
+        if self.pending is not None:
+            return
+        delay = self.last_render + self.min_interval - time.monotonic()
+        if delay > 0:
+            self.pending = self.root.after(int(delay * 1000) + 1, self.run)
+        else:
+            self.pending = self.root.after_idle(self.run)
+
+    def run(self):
+        self.pending = None
+        self.last_render = time.monotonic()
+        self.render()
+
+    def flush(self):
+        """Render now if a redraw is pending"""
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.run()
@@ -0,0 +1,113 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been asked to stop"""
+
+
+class Job:
+    """Handle passed to a job's work function, and returned to whoever submitted it"""
+
+    def __init__(self, runner, name):
+        self.runner = runner
+        self.name = name
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Ask the job to stop at its next progress report"""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def progress(self, message):
+        """Report progress to the UI thread; raises JobCancelled if the job was cancelled"""
+        if self.cancelled:
+            raise JobCancelled()
+        self.runner.events.put((self, 'progress', message))
+
+
+class JobRunner:
+    """Runs slow work on a background thread and hands results back to the Tk thread.
+
+    Work functions must not touch Tk widgets. Their progress messages and
+    results are put on a queue that the Tk thread drains with root.after, and
+    the callbacks given to submit are called from there.
+    """
+
+    def __init__(self, root, on_progress=None, poll_ms=50):
+        self.root = root
+        self.on_progress = on_progress
+        self.poll_ms = poll_ms
+        # One worker: jobs share the ledger connection and must not overlap
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.events = queue.Queue()
+        self.callbacks = {}
+        self.current = None
+        self.polling = None
+
+    @property
+    def busy(self):
+        return self.current is not None
+
+    def submit(self, name, work, on_done=None, on_error=None, on_cancelled=None):
+        """Run work(job) in the background, then call on_done(result), on_error(exception) or on_cancelled()"""
+        job = Job(self, name)
+        self.current = job
+        self.callbacks[job] = (on_done, on_error, on_cancelled)
+        self.executor.submit(self._run, job, work)
+        if self.polling is None:
+            self.polling = self.root.after(self.poll_ms, self.poll)
+        return job
+
+    def _run(self, job, work):
+        try:
+            self.events.put((job, 'done', work(job)))
+        except JobCancelled:
+            self.events.put((job, 'cancelled', None))
+        except Exception as e:
+            self.events.put((job, 'error', e))
+
+    def cancel(self):
+        """Cancel the running job, if any"""
+        if self.current is not None:
+            self.current.cancel()
+
+    def poll(self):
+        """Dispatch queued progress and results on the Tk thread"""
+        self.polling = None
+        while True:
+            try:
+                job, kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                if self.on_progress is not None:
+                    self.on_progress(job, payload)
+                continue
+
+            if job is self.current:
+                self.current = None
+            on_done, on_error, on_cancelled = self.callbacks.pop(job)
+            if self.on_progress is not None:
+                self.on_progress(job, None)
+            if kind == 'done' and on_done is not None:
+                on_done(payload)
+            elif kind == 'error' and on_error is not None:
+                on_error(payload)
+            elif kind == 'cancelled' and on_cancelled is not None:
+                on_cancelled()
+
+        if self.callbacks and self.polling is None:
+            self.polling = self.root.after(self.poll_ms, self.poll)
+
+    def shutdown(self):
+        """Cancel the running job and wait for the worker to stop"""
+        self.cancel()
+        if self.polling is not None:
+            self.root.after_cancel(self.polling)
+            self.polling = None
+        self.executor.shutdown(wait=True)
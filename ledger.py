@@ -0,0 +1,176 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+
+from utils import normalise_description, normalise_descriptions
+
+
+class TransactionLedger:
+    """SQLite store of categorized transactions kept next to the Excel workbook"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # Opened on the Tk thread but also used by background jobs, one at a time
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.create_schema()
+
+    @staticmethod
+    def path_for_workbook(excel_path):
+        """Return the ledger file used for an Excel workbook"""
+        return os.path.splitext(excel_path)[0] + '.ledger.sqlite'
+
+    def create_schema(self):
+        """Create the transactions table and its indexes"""
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                month TEXT NOT NULL,
+                description TEXT NOT NULL,
+                description_key TEXT NOT NULL,
+                pennies INTEGER NOT NULL,
+                category TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_transactions_date_key_pennies
+                ON transactions (date, description_key, pennies);
+            CREATE INDEX IF NOT EXISTS idx_transactions_month_category
+                ON transactions (month, category);
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def format_date(value):
+        """Convert a date value to a YYYY-MM-DD string"""
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d')
+        return str(value)[:10]
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM transactions LIMIT 1").fetchone() is None
+
+    def last_id(self):
+        """Return the id of the most recently inserted transaction, or 0"""
+        return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+
+    def add_transactions(self, transactions, commit=True):
+        """Insert categorized transactions, leaving them uncommitted if commit is False"""
+        rows = []
+        for transaction in transactions:
+            date = self.format_date(transaction['date'])
+            rows.append((
+                date,
+                date[:7],
+                str(transaction['description']),
+                normalise_description(transaction['description']),
+                int(transaction['pennies']),
+                transaction['category']
+            ))
+        self.conn.executemany(
+            "INSERT INTO transactions (date, month, description, description_key, pennies, category) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        if commit:
+            self.conn.commit()
+
+    def add_frame(self, df, commit=True):
+        """Insert categorized transactions from date/description/pennies/category columns"""
+        dates = df['date'].astype(str).str[:10]
+        self.conn.executemany(
+            "INSERT INTO transactions (date, month, description, description_key, pennies, category) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            zip(dates.tolist(),
+                dates.str[:7].tolist(),
+                df['description'].astype(str).tolist(),
+                normalise_descriptions(df['description']).tolist(),
+                df['pennies'].astype('int64').tolist(),
+                df['category'].tolist())
+        )
+        if commit:
+            self.conn.commit()
+
+    def remove_transactions(self, keys, commit=True):
+        """Delete one transaction for each (date, description_key, pennies, category) key"""
+        self.conn.executemany(
+            "DELETE FROM transactions WHERE id = (SELECT id FROM transactions "
+            "WHERE date = ? AND description_key = ? AND pennies = ? AND category = ? "
+            "ORDER BY id DESC LIMIT 1)",
+            keys
+        )
+        if commit:
+            self.conn.commit()
+
+    def recategorize_transactions(self, moves, commit=True):
+        """Move one transaction for each (date, description_key, pennies, old category, new category)"""
+        self.conn.executemany(
+            "UPDATE transactions SET category = ? WHERE id = (SELECT id FROM transactions "
+            "WHERE date = ? AND description_key = ? AND pennies = ? AND category = ? "
+            "ORDER BY id DESC LIMIT 1)",
+            [(new, date, key, pennies, old) for date, key, pennies, old, new in moves]
+        )
+        if commit:
+            self.conn.commit()
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def duplicate_mask(self, df):
+        """Return a boolean array marking rows of df that are already in the ledger"""
+        mask = np.zeros(len(df), dtype=bool)
+        if df.empty:
+            return mask
+        
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS incoming "
+            "(row INTEGER, date TEXT, description_key TEXT, pennies INTEGER)"
+        )
+        self.conn.execute("DELETE FROM incoming")
+        self.conn.executemany(
+            "INSERT INTO incoming VALUES (?, ?, ?, ?)",
+            zip(range(len(df)),
+                df['date'].astype(str).tolist(),
+                normalise_descriptions(df['description']).tolist(),
+                df['pennies'].astype('int64').tolist())
+        )
+        rows = self.conn.execute(
+            "SELECT DISTINCT incoming.row FROM incoming JOIN transactions "
+            "ON transactions.date = incoming.date "
+            "AND transactions.description_key = incoming.description_key "
+            "AND transactions.pennies = incoming.pennies"
+        ).fetchall()
+        mask[[row for (row,) in rows]] = True
+        return mask
+
+    def transaction_keys(self):
+        """Return a cursor over (date, description_key, pennies, category) of every transaction"""
+        return self.conn.execute(
+            "SELECT date, description_key, pennies, category FROM transactions"
+        )
+
+    def months(self):
+        """Return every YYYY-MM month in the ledger in order"""
+        return [month for (month,) in self.conn.execute(
+            "SELECT DISTINCT month FROM transactions ORDER BY month"
+        )]
+
+    def iter_category_transactions(self, month, category):
+        """Return a cursor over (date, description, pennies) rows of one category in a month"""
+        return self.conn.execute(
+            "SELECT date, description, pennies FROM transactions "
+            "WHERE month = ? AND category = ? ORDER BY date, id",
+            (month, category)
+        )
+
+    def monthly_totals(self):
+        """Return (month, category, total pennies) rows for every month"""
+        return self.conn.execute(
+            "SELECT month, category, SUM(pennies) FROM transactions GROUP BY month, category"
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,63 @@
+import json
+import os
+
+
+class MonthlyTotals:
+    """Per-(month, category) totals in pennies, cached in a JSON file next to the workbook.
+
+    The cache records a signature of the workbook and ledger it was last saved
+    with. If either has changed since, the totals are stale and have to be
+    rebuilt from the full history.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = None
+        self.totals = {}
+        if path is None:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.signature = data['signature']
+            self.totals = data['pennies']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def path_for_workbook(excel_path):
+        """Return the totals cache file used for an Excel workbook"""
+        return os.path.splitext(excel_path)[0] + '.totals.json'
+
+    def is_current(self, signature):
+        return self.signature is not None and self.signature == signature
+
+    def months(self):
+        """Return the cached YYYY-MM months in order"""
+        return sorted(self.totals)
+
+    def add(self, df):
+        """Add new rows (date, category, pennies) and return the months that changed"""
+        sums = df.groupby([df['date'].dt.strftime('%Y-%m'), 'category'])['pennies'].sum()
+        for (month, category), pennies in sums.items():
+            month_totals = self.totals.setdefault(month, {})
+            month_totals[category] = month_totals.get(category, 0) + int(pennies)
+        return set(sums.index.get_level_values(0))
+
+    def replace(self, totals):
+        """Replace every total and return all months as changed"""
+        self.totals = totals
+        return set(totals)
+
+    def save(self, signature):
+        """Write the totals with the signature of the workbook they match"""
+        self.signature = signature
+        if self.path is None:
+            return
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'signature': signature, 'pennies': self.totals}, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
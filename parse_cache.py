@@ -0,0 +1,90 @@
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+class ParseCache:
+    """On-disk cache of parsed transaction frames, keyed by file contents.
+
+    Entries are stored as compressed columnar .npz files and evicted least
+    recently used first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser('~'), '.transaction_categorizer_cache')
+        self.max_bytes = max_bytes
+
+    def key(self, file_path, fingerprint):
+        """Hash the file contents together with the parser fingerprint"""
+        digest = hashlib.sha256(str(fingerprint).encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def get(self, key):
+        """Return the cached frame for a key, or None"""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                columns = {}
+                for column in data['__columns__']:
+                    values = data[f'col_{column}']
+                    if f'isna_{column}' in data.files:
+                        values = pd.Series(values).mask(data[f'isna_{column}'])
+                    columns[str(column)] = values
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # Truncated or corrupted entry; remove it so the file is parsed again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return pd.DataFrame(columns)
+
+    def put(self, key, df):
+        """Store a frame under a key and evict old entries if over the size limit"""
+        arrays = {'__columns__': np.array([str(column) for column in df.columns])}
+        for column in df.columns:
+            values = df[column]
+            if pd.api.types.is_numeric_dtype(values):
+                arrays[f'col_{column}'] = values.to_numpy()
+            else:
+                # Strings are stored as a fixed-width array plus a missing-value mask
+                arrays[f'col_{column}'] = values.fillna('').astype(str).to_numpy(dtype=str)
+                arrays[f'isna_{column}'] = values.isna().to_numpy()
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(temp_path, path)
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
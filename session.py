@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+UNCATEGORIZED = -1
+
+
+class CategorizationSession:
+    """Loaded transactions and their category assignments, stored column by column.
+
+    Row i of the import has its date in dates[i], its description in
+    descriptions[description_codes[i]], its cost in whole pennies in pennies[i]
+    and its category in categories[category_codes[i]] (UNCATEGORIZED until one
+    is chosen).
+    """
+
+    def __init__(self, df, categories):
+        self.categories = list(categories)
+        self.category_index = {category: code for code, category in enumerate(self.categories)}
+        self.dates = df['date'].astype(str).to_numpy(dtype=object)
+        # Each distinct description is stored once
+        self.description_codes, self.descriptions = pd.factorize(df['description'].astype(str))
+        self.descriptions = self.descriptions.to_numpy(dtype=object)
+        self.pennies = df['pennies'].to_numpy(dtype=np.int64)
+        self.category_codes = np.full(len(df), UNCATEGORIZED, dtype=np.int8)
+        # Rows that have been handed to a save; they can no longer be changed
+        self.saved = np.zeros(len(df), dtype=bool)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def row(self, i):
+        """Return (date, description, pennies) for a row"""
+        return self.dates[i], self.descriptions[self.description_codes[i]], int(self.pennies[i])
+
+    def category(self, i):
+        code = self.category_codes[i]
+        return None if code == UNCATEGORIZED else self.categories[code]
+
+    def assign(self, i, category):
+        """Set the category of a row, returning the category it replaced (or None)"""
+        previous = self.category(i)
+        if category not in self.category_index:
+            self.category_index[category] = len(self.categories)
+            self.categories.append(category)
+        self.category_codes[i] = self.category_index[category]
+        return previous
+
+    def pending(self):
+        """Return the positions of categorized rows that have not been saved"""
+        return np.flatnonzero((self.category_codes != UNCATEGORIZED) & ~self.saved)
+
+    def mark_saved(self, rows, saved=True):
+        self.saved[rows] = saved
+
+    def frame(self, rows):
+        """Return date/description/pennies/category columns for the given rows"""
+        return pd.DataFrame({
+            'date': self.dates[rows],
+            'description': self.descriptions[self.description_codes[rows]],
+            'pennies': self.pennies[rows],
+            'category': np.array(self.categories, dtype=object)[self.category_codes[rows]]
+        })
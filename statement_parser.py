@@ -1,20 +1,60 @@
 import pandas as pd
+import hashlib
+import os
 import re
-from datetime import datetime
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import tabula  # For PDF parsing
 import pytesseract  # For image/screenshot parsing
 from PIL import Image
 import cv2
 import numpy as np
+try:
+    from pypdf import PdfReader  # Optional: reads the embedded text layer without a JVM
+except ImportError:
+    PdfReader = None
+from utils import (header_profile, normalise_descriptions, pennies_array, parse_dates, parse_dates_for_profile,
+                   ImportProfiles)
+from parse_cache import ParseCache
+
+# Bump when parsing logic changes so cached results are not reused
+PARSER_VERSION = 1
 
 class StatementParser:
-    def __init__(self):
+    def __init__(self, profiles=None, cache=None):
+        # Date formats remembered per statement layout
+        self.profiles = profiles if profiles is not None else ImportProfiles()
+        
+        # Parsed results keyed by file contents, parser version and patterns
+        self.cache = cache if cache is not None else ParseCache()
+        
+        # Fewer rows than this from the PDF text layer means falling back to tabula
+        self.min_text_layer_rows = 3
+        
+        # How the last PDF was read ('text-layer' or 'tabula') and how long it took
+        self.last_extraction = None
+        
+        # Screenshots wider than this are downsampled before OCR
+        self.max_ocr_width = 1600
+        
+        # Seconds spent in each stage of the last image OCR
+        self.last_ocr_timings = None
+        
+        # Images taller than tall_image_height are OCRed in overlapping strips,
+        # at most ocr_tile_workers strips at a time. The greyscale image is still
+        # decoded whole, so memory grows with its height at one byte per pixel
+        self.tall_image_height = 6000
+        self.tile_height = 2000
+        self.tile_overlap = 200
+        self.ocr_tile_workers = min(os.cpu_count() or 1, 4)
+        
         # Common patterns in Santander statements
         self.date_patterns = [
             r'\d{2}/\d{2}/\d{4}',  # DD/MM/YYYY
             r'\d{2}-\d{2}-\d{4}',  # DD-MM-YYYY
             r'\d{2}\s+[A-Za-z]{3}\s+\d{4}'  # DD MMM YYYY
         ]
+        self.date_formats = ['%d/%m/%Y', '%d-%m-%Y', '%d %b %Y']
         
         # Common expense patterns
         self.expense_patterns = [
@@ -31,208 +71,656 @@ class StatementParser:
             r'DEPOSIT.*?(\d+\.\d{2})',
             r'SALARY.*?(\d+\.\d{2})'
         ]
+        
+        # Merchant keywords for each suggested category, in priority order
+        self.category_patterns = {
+            'Groceries': [
+                r'TESCO', r'SAINSBURY', r'ASDA', r'ALDI', r'LIDL', r'MORRISONS',
+                r'WAITROSE', r'CO-OP', r'FOOD', r'GROCERY'
+            ],
+            'Transportation': [
+                r'TRANSPORT', r'TFL', r'TRAIN', r'BUS', r'UBER', r'TAXI',
+                r'PARKING', r'FUEL', r'PETROL', r'SHELL', r'BP', r'ESSO'
+            ],
+            'Entertainment': [
+                r'CINEMA', r'NETFLIX', r'SPOTIFY', r'AMAZON PRIME',
+                r'THEATRE', r'TICKET', r'GAME', r'STEAM'
+            ],
+            'Bills & Utilities': [
+                r'WATER', r'ELECTRIC', r'GAS', r'ENERGY', r'COUNCIL TAX',
+                r'PHONE', r'MOBILE', r'INTERNET', r'BROADBAND', r'TV LICENSE'
+            ],
+            'Dining Out': [
+                r'RESTAURANT', r'CAFE', r'COFFEE', r'STARBUCKS',
+                r'COSTA', r'MCDONALDS', r'KFC', r'TAKEAWAY', r'DELIVEROO',
+                r'JUST EAT', r'UBER EATS'
+            ],
+            'Shopping': [
+                r'AMAZON', r'EBAY', r'ARGOS', r'BOOTS', r'SUPERDRUG',
+                r'NEXT', r'PRIMARK', r'H&M', r'ASOS'
+            ],
+            'Income': [
+                r'SALARY', r'DEPOSIT', r'FASTER PAYMENT FROM'
+            ]
+        }
+        
+        # Any expense pattern, without capture groups, for column-wise matching
+        self.expense_matcher = re.compile('|'.join(
+            re.sub(r'\((?!\?)', '(?:', pattern) for pattern in self.expense_patterns
+        ))
+        
+        # Single regex that classifies a whole OCR line in one match
+        self.line_classifier = self._build_line_classifier()
+        
+        # One compiled alternation per category, matched against upper-cased descriptions
+        self.category_matchers = [
+            (category, re.compile('|'.join(f'(?:{pattern})' for pattern in patterns)))
+            for category, patterns in self.category_patterns.items()
+        ]
+
+    @property
+    def fingerprint(self):
+        """Identify the parsing rules and OCR settings in cache keys"""
+        return hashlib.sha256(repr((
+            PARSER_VERSION, self.date_patterns, self.date_formats,
+            self.expense_patterns, self.income_patterns, self.min_text_layer_rows,
+            self.max_ocr_width, self.tall_image_height, self.tile_height, self.tile_overlap
+        )).encode('utf-8')).hexdigest()
 
     def parse_pdf(self, pdf_path):
         """Parse PDF bank statement"""
         try:
-            # Read PDF file
-            tables = tabula.read_pdf(pdf_path, pages='all')
-            
-            # Combine all tables
-            df = pd.concat(tables, ignore_index=True)
-            
-            # Process the dataframe
-            return self._process_statement_data(df)
+            return self._extract_pdf(pdf_path)[0]
             
         except Exception as e:
             print(f"Error parsing PDF: {str(e)}")
             return None
 
+    def _extract_pdf(self, pdf_path):
+        """Extract transactions from a PDF, raising on failure.
+        
+        Returns the transactions and a dict recording which path was taken.
+        """
+        start = time.perf_counter()
+        
+        cache_key = self.cache.key(pdf_path, 'pdf:' + self.fingerprint)
+        df = self.cache.get(cache_key)
+        if df is not None:
+            method = 'cache'
+        else:
+            # Digitally generated statements carry a text layer; parse it without starting a JVM
+            df = self._extract_pdf_text_layer(pdf_path)
+            if df is not None and len(df) >= self.min_text_layer_rows:
+                method = 'text-layer'
+            else:
+                # Read PDF file
+                tables = tabula.read_pdf(pdf_path, pages='all')
+                
+                # Combine all tables
+                df = pd.concat(tables, ignore_index=True)
+                
+                # Process the dataframe
+                df = self._process_statement_data(df)
+                method = 'tabula'
+            
+            if df is not None:
+                self.cache.put(cache_key, df)
+        
+        self.last_extraction = {'method': method, 'seconds': time.perf_counter() - start}
+        return df, self.last_extraction
+
+    def _extract_pdf_text_layer(self, pdf_path):
+        """Parse the PDF's embedded text with the OCR line rules, or None if there is no usable text"""
+        if PdfReader is None:
+            return None
+        try:
+            pages = [page.extract_text() or '' for page in PdfReader(pdf_path).pages]
+        except Exception:
+            return None
+        if not any(page.strip() for page in pages):
+            return None
+        return self._process_text_statement(pages)
+
+    def parse_pdfs(self, pdf_paths, max_workers=None):
+        """Parse a list or directory of PDF statements.
+        
+        Files are spread over a bounded process pool; each worker keeps its own
+        tabula/JVM session for every file it handles. With max_workers=1 all files
+        are read in this process, in a single JVM session.
+        
+        Returns the combined transactions and a per-file report, including which
+        extraction path ('cache', 'text-layer' or 'tabula') each file took and its timing.
+        """
+        pdf_paths = _expand_paths(pdf_paths, ('.pdf',))
+        if not pdf_paths:
+            return _empty_transactions(), []
+        
+        workers = min(max_workers or os.cpu_count() or 1, len(pdf_paths))
+        if workers <= 1:
+            results = [_parse_pdf_job(pdf_path, self) for pdf_path in pdf_paths]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as pool:
+                results = list(pool.map(_parse_pdf_job, pdf_paths))
+        
+        return self._combine_results(results)
+
+    def _combine_results(self, results, combine=None):
+        """Merge (path, transactions, error, details) results into one frame and a report"""
+        frames = []
+        report = []
+        for path, df, error, details in results:
+            if error is None and (df is None or df.empty):
+                error = "No transactions found"
+            report.append({
+                'file': path,
+                'status': 'failed' if error else 'ok',
+                'rows': 0 if error else len(df),
+                'error': error,
+                **details
+            })
+            if not error:
+                frames.append(df)
+        return (combine or self.combine_statements)(frames), report
+
+    def combine_statements(self, frames):
+        """Concatenate statements, dropping rows repeated across overlapping statements.
+        
+        Identical rows within one statement (two coffees on the same day) are kept;
+        only the extra copies of a row that also appears in another statement go.
+        """
+        frames = [
+            df.assign(occurrence=df.groupby(['date', 'description', 'cost']).cumcount())
+            for df in frames if df is not None and not df.empty
+        ]
+        if not frames:
+            return _empty_transactions()
+        
+        combined = pd.concat(frames, ignore_index=True)
+        combined = combined.drop_duplicates(['date', 'description', 'cost', 'occurrence'])
+        return combined.drop(columns='occurrence').sort_values('date', kind='stable').reset_index(drop=True)
+
     def parse_image(self, image_path):
         """Parse image/screenshot of bank statement"""
         try:
+            return self._extract_image(image_path)
+            
+        except Exception as e:
+            print(f"Error parsing image: {str(e)}")
+            return None
+
+    def _extract_image(self, image_path):
+        """OCR an image and parse its text, raising on failure"""
+        cache_key = self.cache.key(image_path, 'image:' + self.fingerprint)
+        df = self.cache.get(cache_key)
+        if df is not None:
+            self.last_ocr_timings = None
+            return df
+        
+        timings = {}
+        
+        if self._is_tall_image(image_path):
+            text = self._ocr_tall_image(image_path, timings)
+            stage_start = time.perf_counter()
+        else:
+            stage_start = time.perf_counter()
+            
             # Read image
             image = cv2.imread(image_path)
+            if image is None:
+                raise ValueError(f"Could not read image {image_path}")
+            timings['read'], stage_start = _lap(stage_start)
             
             # Preprocess image
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-            
-            # Extract text using OCR
-            text = pytesseract.image_to_string(thresh)
+            thresh = self._preprocess_image(image)
+            timings['preprocess'], stage_start = _lap(stage_start)
             
-            # Process the text
-            return self._process_text_statement(text)
+            # Only OCR the blocks of text, not banners and UI chrome
+            regions = self._find_text_regions(thresh)
+            timings['regions'], stage_start = _lap(stage_start)
             
-        except Exception as e:
-            print(f"Error parsing image: {str(e)}")
-            return None
+            # Extract text using OCR
+            text = self._ocr_regions(thresh, regions)
+            timings['ocr'], stage_start = _lap(stage_start)
+        
+        # Process the text
+        df = self._process_text_statement(text)
+        timings['parse'], stage_start = _lap(stage_start)
+        
+        self.last_ocr_timings = timings
+        self.cache.put(cache_key, df)
+        return df
 
-    def _process_text_statement(self, text):
-        """Process text extracted from statement"""
-        transactions = []
+    def _preprocess_image(self, image):
+        """Greyscale, downsample oversized screenshots and threshold"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        if width > self.max_ocr_width:
+            scale = self.max_ocr_width / width
+            gray = cv2.resize(gray, (self.max_ocr_width, max(int(height * scale), 1)),
+                              interpolation=cv2.INTER_AREA)
+        return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+    def _find_text_regions(self, thresh, padding=8):
+        """Find blocks of text lines with morphology and contour analysis.
         
-        # Split into lines
-        lines = text.split('\n')
+        Returns full-width (x, y, w, h) bands in reading order, so columns such
+        as right-aligned amounts stay on the same crop as their description.
+        """
+        height, width = thresh.shape
+        # Make ink white whatever the theme: the background is the majority colour
+        ink = thresh if np.mean(thresh) < 127 else cv2.bitwise_not(thresh)
         
-        for line in lines:
-            # Skip empty lines
-            if not line.strip():
+        # Smear characters into text lines
+        line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(width // 40, 9), 3))
+        lines = cv2.dilate(ink, line_kernel)
+        contours = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        
+        lines = []
+        narrow = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if h < 8:
                 continue
-                
-            # Try to find date
-            date = None
-            for pattern in self.date_patterns:
-                match = re.search(pattern, line)
-                if match:
-                    date_str = match.group()
-                    try:
-                        if '/' in date_str:
-                            date = datetime.strptime(date_str, '%d/%m/%Y')
-                        elif '-' in date_str:
-                            date = datetime.strptime(date_str, '%d-%m-%Y')
-                        else:
-                            date = datetime.strptime(date_str, '%d %b %Y')
-                        break
-                    except ValueError:
-                        continue
-            
-            if not date:
+            # Skip solid banners and buttons
+            if cv2.countNonZero(ink[y:y + h, x:x + w]) > 0.5 * w * h:
                 continue
-                
-            # Try to find amount and determine if expense or income
-            amount = None
-            is_expense = False
-            
-            # Check expense patterns
-            for pattern in self.expense_patterns:
-                match = re.search(pattern, line)
-                if match:
-                    amount = float(match.group(1))
-                    is_expense = True
+            # Short runs such as amounts only count where they sit beside a text line
+            if w < width * 0.2:
+                narrow.append((y, y + h))
+            else:
+                lines.append((y, y + h))
+        if not lines:
+            return []
+        
+        # Join lines separated by less than two line heights into one block
+        lines.sort()
+        max_gap = 2 * int(np.median([y1 - y0 for y0, y1 in lines]))
+        blocks = [list(lines[0])]
+        for y0, y1 in lines[1:]:
+            block = blocks[-1]
+            if y0 - block[1] <= max_gap:
+                block[1] = max(block[1], y1)
+            else:
+                blocks.append([y0, y1])
+        
+        # Stretch a block over short runs that overlap it vertically
+        for y0, y1 in narrow:
+            for block in blocks:
+                if y0 < block[1] and y1 > block[0]:
+                    block[0], block[1] = min(block[0], y0), max(block[1], y1)
                     break
-            
-            # Check income patterns if no expense found
-            if amount is None:
-                for pattern in self.income_patterns:
-                    match = re.search(pattern, line)
-                    if match:
-                        amount = float(match.group(1))
-                        break
-            
-            if amount is not None:
-                # Get description (remove date and amount)
-                description = line
-                for pattern in self.date_patterns + [r'\d+\.\d{2}']:
-                    description = re.sub(pattern, '', description)
-                description = description.strip()
-                
-                transactions.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'description': description,
-                    'cost': -amount if is_expense else amount
-                })
         
-        return pd.DataFrame(transactions)
+        return [
+            (0, max(y0 - padding, 0), width, min(y1 + padding, height) - max(y0 - padding, 0))
+            for y0, y1 in blocks
+        ]
 
-    def _process_statement_data(self, df):
-        """Process dataframe from PDF parsing"""
-        # Try to identify date and amount columns
+    def _ocr_regions(self, thresh, regions):
+        """OCR each region concurrently (tesseract runs out of process) and join the text in order"""
+        if not regions:
+            return pytesseract.image_to_string(thresh)
+        
+        crops = [thresh[y:y + h, x:x + w] for x, y, w, h in regions]
+        with ThreadPoolExecutor(max_workers=min(len(crops), os.cpu_count() or 1)) as pool:
+            texts = list(pool.map(pytesseract.image_to_string, crops))
+        return '\n'.join(texts)
+
+    def _is_tall_image(self, image_path):
+        """Check the image height from its header without decoding the pixels"""
+        try:
+            with Image.open(image_path) as image:
+                return image.size[1] > self.tall_image_height
+        except Exception:
+            return False
+
+    def _ocr_tall_image(self, image_path, timings):
+        """OCR a very tall scrolling screenshot strip by strip and stitch the lines back together.
+        
+        The whole image is decoded to greyscale up front, one byte per pixel, so
+        memory still grows with the image height; only the thresholded and
+        downsampled copies are limited to ocr_tile_workers strips at a time.
+        """
+        stage_start = time.perf_counter()
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError(f"Could not read image {image_path}")
+        timings['read'], stage_start = _lap(stage_start)
+        
+        # One threshold for the whole image so every strip is binarised the same way
+        level = cv2.threshold(np.ascontiguousarray(gray[::8, ::8]), 0, 255,
+                              cv2.THRESH_BINARY + cv2.THRESH_OTSU)[0]
+        height, width = gray.shape
+        scale = min(self.max_ocr_width / width, 1.0)
+        step = self.tile_height - self.tile_overlap
+        tops = list(range(0, max(height - self.tile_overlap, 1), step))
+        
+        def ocr_strip(top):
+            strip = gray[top:top + self.tile_height]
+            if scale < 1.0:
+                strip = cv2.resize(strip, (self.max_ocr_width, max(int(strip.shape[0] * scale), 1)),
+                                   interpolation=cv2.INTER_AREA)
+            thresh = cv2.threshold(strip, level, 255, cv2.THRESH_BINARY)[1]
+            data = pytesseract.image_to_data(thresh, output_type=pytesseract.Output.DICT)
+            return [(top + y / scale, text) for y, text in _rows_from_ocr_data(data)]
+        
+        with ThreadPoolExecutor(max_workers=self.ocr_tile_workers) as pool:
+            strips = list(pool.map(ocr_strip, tops))
+        timings['ocr'], stage_start = _lap(stage_start)
+        
+        text = self._stitch_strips(tops, strips)
+        timings['stitch'], stage_start = _lap(stage_start)
+        return text
+
+    def _stitch_strips(self, tops, strips):
+        """Join the rows of overlapping strips into one text.
+        
+        Each strip owns the rows whose centre falls between the middles of its
+        overlaps with the neighbouring strips, so a row cut by one strip's edge is
+        taken whole from the other. Identical rows either side of a seam are dropped.
+        """
+        half_overlap = self.tile_overlap / 2
+        lines = []
+        for i, (top, rows) in enumerate(zip(tops, strips)):
+            start = top + half_overlap if i > 0 else float('-inf')
+            end = tops[i + 1] + half_overlap if i + 1 < len(tops) else float('inf')
+            seam = len(lines)
+            for y, text in rows:
+                if not start <= y < end:
+                    continue
+                # The same row read slightly off-centre by both strips
+                if seam and len(lines) == seam and ' '.join(text.split()) == ' '.join(lines[-1].split()):
+                    continue
+                lines.append(text)
+        return '\n'.join(lines)
+
+    def iter_parse_images(self, image_paths, max_workers=None):
+        """OCR a list or directory of images across a process pool.
+        
+        Yields (path, transactions, error message, details) as each image finishes,
+        so callers can show rows before the whole batch is done.
+        """
+        image_paths = _expand_paths(image_paths, IMAGE_EXTENSIONS)
+        if not image_paths:
+            return
+        
+        workers = min(max_workers or os.cpu_count() or 1, len(image_paths))
+        if workers <= 1:
+            for image_path in image_paths:
+                yield _parse_image_job(image_path, self)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as pool:
+            futures = [pool.submit(_parse_image_job, image_path) for image_path in image_paths]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def parse_images(self, image_paths, max_workers=None, on_result=None):
+        """OCR a batch of screenshots and merge them into one transactions frame.
+        
+        on_result, if given, is called with each (path, transactions, error, details)
+        result as soon as that image is done. Returns the combined transactions and
+        a per-file report, both in input order.
+        """
+        order = {path: i for i, path in enumerate(_expand_paths(image_paths, IMAGE_EXTENSIONS))}
+        results = []
+        for result in self.iter_parse_images(list(order), max_workers):
+            if on_result is not None:
+                on_result(result)
+            results.append(result)
+        results.sort(key=lambda result: order[result[0]])
+        # Consecutive screenshots of one long page share rows at their edges
+        return self._combine_results(results, self.merge_overlapping)
+
+    def merge_overlapping(self, frames):
+        """Splice consecutive screenshot imports, dropping the rows each shares with the previous one.
+        
+        Rows are fingerprinted on date, normalised description and pennies, and the
+        longest suffix of the rows so far that is also a prefix of the next image's
+        rows is found in linear time, so a long batch needs no pairwise comparisons.
+        """
+        merged = []
+        merged_keys = []
+        for df in frames:
+            if df is None or df.empty:
+                continue
+            keys = list(zip(df['date'].astype(str),
+                            normalise_descriptions(df['description']),
+                            pennies_array(df['cost'])))
+            overlap = _longest_overlap(merged_keys[-len(keys):], keys)
+            merged.append(df.iloc[overlap:])
+            merged_keys.extend(keys[overlap:])
+        
+        if not merged:
+            return _empty_transactions()
+        return pd.concat(merged, ignore_index=True)
+
+    def _build_line_classifier(self):
+        """Combine the date, expense and income patterns into one multi-line regex"""
+        # Each pattern gets an optional lookahead, so one match per line records the
+        # first hit of every pattern and the original priority order can be applied afterwards
+        lookaheads = [
+            f'(?=(?:.*?(?P<date_{i}>{pattern}))?)'
+            for i, pattern in enumerate(self.date_patterns)
+        ]
+        for kind, patterns in (('expense', self.expense_patterns), ('income', self.income_patterns)):
+            for i, pattern in enumerate(patterns):
+                named = re.sub(r'\((?!\?)', f'(?P<{kind}_{i}>', pattern, count=1)
+                lookaheads.append(f'(?=(?:.*?{named})?)')
+        # Lines without any date or amount fail on the first two lookaheads
+        prefilter = '(?=.*?(?:' + '|'.join(self.date_patterns) + r'))(?=.*?\d+\.\d{2})'
+        return re.compile('^' + prefilter + ''.join(lookaheads) + '(?P<line>.*)$', re.MULTILINE)
+
+    def _process_text_statement(self, text):
+        """Process text extracted from statement (a string, or a list of page texts)"""
+        pages = pd.Series([text] if isinstance(text, str) else list(text), dtype=object)
+        lines = pages.str.extractall(self.line_classifier).reset_index(drop=True)
+        
+        # Dates: first pattern whose match parses, in pattern order
+        date = pd.Series(pd.NaT, index=lines.index, dtype='datetime64[ns]')
+        for i, date_format in enumerate(self.date_formats):
+            date = date.fillna(parse_dates(lines[f'date_{i}'], date_format))
+        
+        # Amounts: first expense pattern, then first income pattern
+        expense_cols = [f'expense_{i}' for i in range(len(self.expense_patterns))]
+        income_cols = [f'income_{i}' for i in range(len(self.income_patterns))]
+        expense = lines[expense_cols].bfill(axis=1).iloc[:, 0].astype(float)
+        income = lines[income_cols].bfill(axis=1).iloc[:, 0].astype(float)
+        amount = (-expense).fillna(income)
+        
+        keep = date.notna() & amount.notna()
+        lines = lines[keep]
+        
+        # Get description (remove date and amount)
+        strip_pattern = '|'.join(self.date_patterns + [r'\d+\.\d{2}'])
+        description = lines['line'].str.replace(strip_pattern, '', regex=True).str.strip()
+        
+        return pd.DataFrame({
+            'date': date[keep].dt.strftime('%Y-%m-%d'),
+            'description': description,
+            'cost': amount[keep]
+        }).reset_index(drop=True)
+
+    def _detect_columns(self, df, sample_size=200):
+        """Guess the date, amount and description columns from a bounded sample of each column"""
         date_col = None
         amount_col = None
         desc_col = None
+        date_regex = '|'.join(self.date_patterns)
         
         for col in df.columns:
+            sample = df[col].dropna().head(sample_size).astype(str)
+            if sample.empty:
+                continue
             # Look for date column
-            if df[col].astype(str).str.match(self.date_patterns[0]).any():
+            if sample.str.match(date_regex).any():
                 date_col = col
             # Look for amount column (contains currency symbols or decimal numbers)
-            elif df[col].astype(str).str.contains(r'£?\d+\.\d{2}').any():
+            elif sample.str.contains(r'£?\d+\.\d{2}').any():
                 amount_col = col
             # Assume the longest text column is description
-            elif df[col].astype(str).str.len().mean() > 20:
+            elif sample.str.len().mean() > 20:
                 desc_col = col
         
-        if not all([date_col, amount_col, desc_col]):
+        return date_col, amount_col, desc_col
+
+    def _process_statement_data(self, df):
+        """Process dataframe from PDF parsing"""
+        # Tables from different pages can repeat column names; keep the first of each
+        df = df.loc[:, ~df.columns.duplicated()].reset_index(drop=True)
+        
+        # Try to identify date and amount columns
+        date_col, amount_col, desc_col = self._detect_columns(df)
+        if date_col is None or amount_col is None or desc_col is None:
             return None
-            
-        # Create new dataframe with standardized columns
-        transactions = []
-        
-        for _, row in df.iterrows():
-            try:
-                # Parse date
-                date_str = str(row[date_col])
-                for pattern in self.date_patterns:
-                    match = re.search(pattern, date_str)
-                    if match:
-                        date_str = match.group()
-                        break
-                
-                if '/' in date_str:
-                    date = datetime.strptime(date_str, '%d/%m/%Y')
-                elif '-' in date_str:
-                    date = datetime.strptime(date_str, '%d-%m-%Y')
-                else:
-                    date = datetime.strptime(date_str, '%d %b %Y')
-                
-                # Parse amount
-                amount_str = str(row[amount_col])
-                amount_match = re.search(r'£?(\d+\.\d{2})', amount_str)
-                if amount_match:
-                    amount = float(amount_match.group(1))
-                    # Determine if expense based on description
-                    is_expense = any(re.search(pattern, str(row[desc_col])) for pattern in self.expense_patterns)
-                    
-                    transactions.append({
-                        'date': date.strftime('%Y-%m-%d'),
-                        'description': str(row[desc_col]).strip(),
-                        'cost': -amount if is_expense else amount
-                    })
-            except (ValueError, AttributeError):
-                continue
         
-        return pd.DataFrame(transactions)
+        # Parse the whole date column with one inferred format; cells the patterns miss,
+        # such as dates without leading zeros, are parsed as they are
+        raw_dates = df[date_col].astype(str).str.strip()
+        date_strings = raw_dates.str.extract('(' + '|'.join(self.date_patterns) + ')', expand=False)
+        date_strings = date_strings.fillna(raw_dates)
+        dates = parse_dates_for_profile(date_strings, self.profiles, header_profile(df.columns))
+        
+        # Parse amounts
+        amounts = df[amount_col].astype(str).str.extract(r'£?(\d+\.\d{2})', expand=False).astype(float)
+        
+        # Determine if expense based on description
+        descriptions = df[desc_col].astype(str)
+        is_expense = descriptions.str.contains(self.expense_matcher)
+        
+        keep = dates.notna() & amounts.notna()
+        return pd.DataFrame({
+            'date': dates[keep].dt.strftime('%Y-%m-%d'),
+            'description': descriptions[keep].str.strip(),
+            'cost': amounts[keep].where(~is_expense[keep], -amounts[keep])
+        }).reset_index(drop=True)
 
     def suggest_categories(self, transactions_df):
         """Suggest categories based on transaction descriptions"""
-        category_patterns = {
-            'Groceries': [
-                r'TESCO', r'SAINSBURY', r'ASDA', r'ALDI', r'LIDL', r'MORRISONS',
-                r'WAITROSE', r'CO-OP', r'FOOD', r'GROCERY'
-            ],
-            'Transportation': [
-                r'TRANSPORT', r'TFL', r'TRAIN', r'BUS', r'UBER', r'TAXI',
-                r'PARKING', r'FUEL', r'PETROL', r'SHELL', r'BP', r'ESSO'
-            ],
-            'Entertainment': [
-                r'CINEMA', r'NETFLIX', r'SPOTIFY', r'AMAZON PRIME',
-                r'THEATRE', r'TICKET', r'GAME', r'STEAM'
-            ],
-            'Bills & Utilities': [
-                r'WATER', r'ELECTRIC', r'GAS', r'ENERGY', r'COUNCIL TAX',
-                r'PHONE', r'MOBILE', r'INTERNET', r'BROADBAND', r'TV LICENSE'
-            ],
-            'Dining Out': [
-                r'RESTAURANT', r'CAFE', r'COFFEE', r'STARBUCKS',
-                r'COSTA', r'MCDONALDS', r'KFC', r'TAKEAWAY', r'DELIVEROO',
-                r'JUST EAT', r'UBER EATS'
-            ],
-            'Shopping': [
-                r'AMAZON', r'EBAY', r'ARGOS', r'BOOTS', r'SUPERDRUG',
-                r'NEXT', r'PRIMARK', r'H&M', r'ASOS'
-            ],
-            'Income': [
-                r'SALARY', r'DEPOSIT', r'FASTER PAYMENT FROM'
-            ]
-        }
+        descriptions = transactions_df['description'].astype(str).str.upper()
+        suggestions = pd.Series('Other', index=transactions_df.index, dtype=object)
+        unmatched = pd.Series(True, index=transactions_df.index)
         
-        def suggest_category(description):
-            description = description.upper()
-            for category, patterns in category_patterns.items():
-                if any(re.search(pattern, description, re.IGNORECASE) for pattern in patterns):
-                    return category
-            return 'Other'
+        # Categories are tried in priority order; each row keeps the first one that matches
+        for category, matcher in self.category_matchers:
+            if not unmatched.any():
+                break
+            matched = descriptions[unmatched].str.contains(matcher, regex=True)
+            matched_index = matched.index[matched.to_numpy(dtype=bool)]
+            suggestions[matched_index] = category
+            unmatched[matched_index] = False
         
-        transactions_df['suggested_category'] = transactions_df['description'].apply(suggest_category)
-        return transactions_df 
\ No newline at end of file
+        transactions_df['suggested_category'] = suggestions
+        return transactions_df
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def _lap(start):
+    """Return the seconds since start and a new start time"""
+    now = time.perf_counter()
+    return now - start, now
+
+
+def _rows_from_ocr_data(data):
+    """Group tesseract word boxes into text rows as (centre y, text), top to bottom.
+    
+    Words are grouped by vertical position rather than tesseract's line numbers, so
+    a date on the left and an amount on the far right end up on the same row.
+    """
+    words = [
+        (data['top'][i] + data['height'][i] / 2, data['height'][i], data['left'][i], word)
+        for i, word in enumerate(data['text'])
+        if word.strip()
+    ]
+    if not words:
+        return []
+    
+    words.sort()
+    tolerance = np.median([height for _, height, _, _ in words]) / 2
+    rows = []
+    current = [words[0]]
+    for word in words[1:]:
+        if word[0] - current[0][0] <= tolerance:
+            current.append(word)
+        else:
+            rows.append(current)
+            current = [word]
+    rows.append(current)
+    
+    return [
+        (sum(word[0] for word in row) / len(row),
+         ' '.join(word[3] for word in sorted(row, key=lambda word: word[2])))
+        for row in rows
+    ]
+
+
+def _longest_overlap(previous, current):
+    """Length of the longest suffix of previous that is also a prefix of current.
+    
+    Uses the KMP prefix function over current + separator + previous.
+    """
+    sequence = list(current) + [object()] + list(previous)
+    prefix = [0] * len(sequence)
+    for i in range(1, len(sequence)):
+        k = prefix[i - 1]
+        while k > 0 and sequence[i] != sequence[k]:
+            k = prefix[k - 1]
+        if sequence[i] == sequence[k]:
+            k += 1
+        prefix[i] = k
+    return prefix[-1] if previous else 0
+
+
+def _empty_transactions():
+    return pd.DataFrame(columns=['date', 'description', 'cost'])
+
+
+def _expand_paths(paths, extensions):
+    """Turn a directory or a list of files into a sorted list of matching files"""
+    if isinstance(paths, (str, os.PathLike)):
+        if os.path.isdir(paths):
+            return sorted(
+                os.path.join(paths, name) for name in os.listdir(paths)
+                if name.lower().endswith(extensions)
+            )
+        return [paths]
+    return list(paths)
+
+
+# Parser reused by every job a worker process runs, so its JVM stays warm
+_worker_parser = None
+
+
+def _init_worker(parser):
+    """Pool initializer: give each worker process a copy of the submitting parser and its settings"""
+    global _worker_parser
+    _worker_parser = parser
+
+
+def _get_worker_parser():
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = StatementParser()
+    return _worker_parser
+
+
+def _parse_pdf_job(pdf_path, parser=None):
+    """Worker entry point: returns (path, transactions, error message, extraction details)"""
+    parser = parser or _get_worker_parser()
+    try:
+        df, details = parser._extract_pdf(pdf_path)
+        return pdf_path, df, None, details
+    except Exception as e:
+        return pdf_path, None, str(e), {}
+
+
+def _parse_image_job(image_path, parser=None):
+    """Worker entry point for OCR: returns (path, transactions, error message, details)"""
+    parser = parser or _get_worker_parser()
+    start = time.perf_counter()
+    try:
+        df = parser._extract_image(image_path)
+        return image_path, df, None, {'seconds': time.perf_counter() - start, 'stages': parser.last_ocr_timings}
+    except Exception as e:
+        return image_path, None, str(e), {}
@@ -0,0 +1,59 @@
+from openpyxl.styles import NamedStyle, PatternFill, Font, Border, Side
+
+CURRENCY_FORMAT = '£#,##0.00'
+
+# Named styles shared by every cell that uses them; assigning one is a single
+# lookup instead of building new Border/Side/Font objects per cell
+CATEGORY_HEADER = 'Category Header'
+CATEGORY_HEADER_END = 'Category Header End'
+COLUMN_HEADER = 'Column Header'
+COLUMN_HEADER_END = 'Column Header End'
+TRANSACTION = 'Transaction'
+TRANSACTION_COST = 'Transaction Cost'
+AMOUNT = 'Amount'
+TOTAL_AMOUNT = 'Total Amount'
+
+
+def _border(right='thin'):
+    return Border(
+        left=Side(style='thin'),
+        right=Side(style=right),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+
+
+def _named_style(name, font=None, fill=None, border=None, number_format=None):
+    style = NamedStyle(name=name)
+    if font is not None:
+        style.font = font
+    if fill is not None:
+        style.fill = fill
+    if border is not None:
+        style.border = border
+    if number_format is not None:
+        style.number_format = number_format
+    return style
+
+
+def _build_styles():
+    header_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
+    header_font = Font(bold=True)
+    return [
+        _named_style(CATEGORY_HEADER, font=header_font, fill=header_fill, border=_border()),
+        _named_style(CATEGORY_HEADER_END, font=header_font, fill=header_fill, border=_border('thick')),
+        _named_style(COLUMN_HEADER, font=header_font, border=_border()),
+        _named_style(COLUMN_HEADER_END, font=header_font, border=_border('thick')),
+        _named_style(TRANSACTION, border=_border()),
+        _named_style(TRANSACTION_COST, border=_border('thick'), number_format=CURRENCY_FORMAT),
+        _named_style(AMOUNT, border=_border(), number_format=CURRENCY_FORMAT),
+        _named_style(TOTAL_AMOUNT, font=header_font, border=_border(), number_format=CURRENCY_FORMAT),
+    ]
+
+
+def register_styles(wb):
+    """Add the shared named styles to a workbook that does not have them yet"""
+    existing = set(wb.named_styles)
+    for style in _build_styles():
+        if style.name not in existing:
+            wb.add_named_style(style)
@@ -0,0 +1,73 @@
+INDEX_SHEET = '_Index'
+FIRST_DATA_ROW = 3
+INDEX_HEADER = ["Sheet", "Block", "Next Row"]
+
+
+class TailIndex:
+    """Next free row of every category block on every month sheet.
+
+    Stored in a hidden sheet of the workbook so appends can go straight to the
+    right row. Entries are checked against the cells they point at when the
+    workbook is opened, and rescanned if they are stale.
+    """
+
+    def __init__(self, wb, block_count):
+        self.wb = wb
+        self.block_count = block_count
+        self.rows = {}
+        if INDEX_SHEET in wb.sheetnames:
+            for values in wb[INDEX_SHEET].iter_rows(min_row=2, max_col=3, values_only=True):
+                sheet_name, block, next_row = values
+                if isinstance(block, int) and isinstance(next_row, int):
+                    self.rows[(sheet_name, block)] = next_row
+        self.repair()
+
+    @staticmethod
+    def is_month_sheet(sheet_name):
+        return sheet_name not in ("Dashboard", INDEX_SHEET)
+
+    def repair(self):
+        """Check every entry against its sheet and rescan the blocks that do not match"""
+        self.rows = {key: row for key, row in self.rows.items() if key[0] in self.wb.sheetnames}
+        for sheet_name in self.wb.sheetnames:
+            if not self.is_month_sheet(sheet_name):
+                continue
+            ws = self.wb[sheet_name]
+            for block in range(self.block_count):
+                row = self.rows.get((sheet_name, block))
+                if row is None or not self._is_tail(ws, block * 3 + 1, row):
+                    self.rows[(sheet_name, block)] = self._scan(ws, block * 3 + 1)
+
+    @staticmethod
+    def _is_tail(ws, col, row):
+        if row < FIRST_DATA_ROW or ws.cell(row=row, column=col).value is not None:
+            return False
+        return row == FIRST_DATA_ROW or ws.cell(row=row - 1, column=col).value is not None
+
+    @staticmethod
+    def _scan(ws, col):
+        row = FIRST_DATA_ROW
+        while ws.cell(row=row, column=col).value is not None:
+            row += 1
+        return row
+
+    def next_row(self, ws, block):
+        """Return the first empty row of a category block"""
+        key = (ws.title, block)
+        if key not in self.rows:
+            self.rows[key] = self._scan(ws, block * 3 + 1)
+        return self.rows[key]
+
+    def set_next_row(self, ws, block, row):
+        self.rows[(ws.title, block)] = row
+
+    def save(self):
+        """Write the index to its hidden sheet"""
+        if INDEX_SHEET in self.wb.sheetnames:
+            self.wb.remove(self.wb[INDEX_SHEET])
+        ws = self.wb.create_sheet(INDEX_SHEET)
+        ws.sheet_state = 'hidden'
+        ws.append(INDEX_HEADER)
+        for (sheet_name, block), row in sorted(self.rows.items()):
+            if sheet_name in self.wb.sheetnames:
+                ws.append([sheet_name, block, row])
@@ -4,28 +4,56 @@ import pandas as pd
 from datetime import datetime
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import seaborn as sns
 import openpyxl
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 import os
+from collections import Counter
 import pickle
 import numpy as np
+from utils import (duplicate_key, normalise_descriptions, to_pennies, pennies_array, sniff_encoding,
+                   SINGLE_BYTE_ENCODINGS, csv_header_columns, header_profile, parse_dates_for_profile, ImportProfiles)
+from ledger import TransactionLedger
+from chart import MonthlyCategoryChart, RedrawScheduler
+from parse_cache import ParseCache
+import styles
+from tail_index import TailIndex
+from monthly_totals import MonthlyTotals
+from workbook_export import export_workbook, extra_sheets
+from jobs import JobRunner
+from session import CategorizationSession
+
+# Bump when import normalisation changes so cached imports are not reused
+IMPORT_VERSION = 3
 
 class TransactionCategorizer:
-    def __init__(self, root):
+    def __init__(self, root, use_ledger=False, max_chart_fps=10):
         self.root = root
         self.root.title("Transaction Categorizer")
         self.root.geometry("1200x800")
         
         # Store existing transactions
         self.existing_transactions = []
+        self.duplicate_index = set()
+        
+        # Optional SQLite ledger kept next to the workbook, turned on with the "Use ledger" checkbox
+        self.use_ledger = use_ledger
+        self.ledger = None
+        
+        # Encoding and date settings remembered per bank export format
+        self.import_profiles = ImportProfiles()
+        
+        # Normalised imports keyed by file contents
+        self.parse_cache = ParseCache()
+        
+        # Upper bound on chart redraws per second while categorizing
+        self.max_chart_fps = max_chart_fps
         
         # Store figure reference
         self.fig = None
         self.canvas = None
         
-        # Bind window closing event
+        # Bind window closing event; closing waits for a running job to finish
+        self.closing = False
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
         # Predefined categories
@@ -43,8 +71,7 @@ class TransactionCategorizer:
         }
         
         self.current_index = 0
-        self.transactions = None
-        self.categorized_data = []
+        self.session = None
         
         # Create main container
         self.main_container = ttk.PanedWindow(root, orient=tk.HORIZONTAL)
@@ -111,10 +138,32 @@ class TransactionCategorizer:
                                    command=self.save_categorized_data)
         self.save_button.pack(pady=10)
         
+        # Opt in to the SQLite ledger
+        self.ledger_var = tk.BooleanVar(value=self.use_ledger)
+        self.ledger_check = tk.Checkbutton(self.left_frame, text="Use ledger",
+                                         variable=self.ledger_var, command=self.toggle_ledger)
+        self.ledger_check.pack()
+        
+        # Full rebuild of every sheet from the ledger
+        self.rebuild_button = tk.Button(self.left_frame, text="Rebuild Workbook",
+                                      command=self.rebuild_workbook)
+        self.rebuild_button.pack(pady=10)
+        
+        # Progress of background imports and saves
+        self.status_label = tk.Label(self.left_frame, text="", font=("Arial", 10))
+        self.status_label.pack()
+        
+        self.cancel_button = tk.Button(self.left_frame, text="Cancel",
+                                     command=self.cancel_job, state=tk.DISABLED)
+        self.cancel_button.pack(pady=5)
+        self.jobs = JobRunner(self.root, on_progress=self.show_job_progress)
+        
         # Right frame - Analysis
         self.fig, self.ax = plt.subplots(figsize=(8, 6))
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.right_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.chart = MonthlyCategoryChart(self.ax, self.categories.values())
+        self.redraw_scheduler = RedrawScheduler(self.root, self.update_pie_chart, self.max_chart_fps)
     
     def handle_keypress(self, event):
         if event.char in self.categories:
@@ -126,67 +175,282 @@ class TransactionCategorizer:
             return []
         
         existing_transactions = []
-        wb = openpyxl.load_workbook(excel_file)
+        # Read-only mode streams rows instead of loading every styled cell
+        wb = openpyxl.load_workbook(excel_file, read_only=True)
         
-        for sheet_name in wb.sheetnames:
-            if sheet_name == "Dashboard":  # Skip dashboard sheet
-                continue
+        try:
+            for sheet_name in wb.sheetnames:
+                if not TailIndex.is_month_sheet(sheet_name):  # Skip dashboard and index sheets
+                    continue
                 
-            ws = wb[sheet_name]
-            current_col = 1
-            
-            # For each category
-            for category in self.categories.values():
-                row = 3  # Start after headers
+                existing_transactions.extend(self.read_sheet_transactions(wb[sheet_name]))
+        finally:
+            wb.close()
+        
+        return existing_transactions
+
+    def read_sheet_transactions(self, ws):
+        """Read every category block of a month sheet in a single pass over its rows"""
+        categories = list(self.categories.values())
+        blocks = [[] for _ in categories]
+        open_blocks = set(range(len(categories)))
+        
+        for values in ws.iter_rows(min_row=3, values_only=True):
+            for block in list(open_blocks):
+                col = block * 3
+                date_value, desc_value, cost_value = (tuple(values[col:col + 3]) + (None, None, None))[:3]
                 
-                # Read transactions for this category
-                while True:
-                    date_cell = ws.cell(row=row, column=current_col)
-                    if not date_cell.value:
-                        break
-                        
-                    desc_cell = ws.cell(row=row, column=current_col + 1)
-                    cost_cell = ws.cell(row=row, column=current_col + 2)
-                    
-                    # Handle cost value
-                    try:
-                        cost_value = float(cost_cell.value if cost_cell.value is not None else 0)
-                    except (ValueError, TypeError):
-                        cost_value = 0
-                    
-                    # Handle date value
-                    try:
-                        if isinstance(date_cell.value, datetime):
-                            date_value = date_cell.value.strftime('%Y-%m-%d')
-                        else:
-                            date_value = datetime.strptime(str(date_cell.value), '%Y-%m-%d').strftime('%Y-%m-%d')
-                    except (ValueError, TypeError):
-                        # Skip invalid date entries
-                        row += 1
-                        continue
-                    
-                    existing_transactions.append({
-                        'date': date_value,
-                        'description': str(desc_cell.value) if desc_cell.value else '',
-                        'cost': cost_value,
-                        'category': category
-                    })
-                    row += 1
+                # A block ends at its first empty date cell
+                if not date_value:
+                    open_blocks.discard(block)
+                    continue
                 
-                current_col += 3
+                # Handle cost value
+                try:
+                    pennies = to_pennies(cost_value if cost_value is not None else 0)
+                except (ValueError, TypeError):
+                    pennies = 0
+                
+                # Handle date value
+                try:
+                    if isinstance(date_value, datetime):
+                        date_value = date_value.strftime('%Y-%m-%d')
+                    else:
+                        date_value = datetime.strptime(str(date_value), '%Y-%m-%d').strftime('%Y-%m-%d')
+                except (ValueError, TypeError):
+                    # Skip invalid date entries
+                    continue
+                
+                blocks[block].append({
+                    'date': date_value,
+                    'description': str(desc_value) if desc_value else '',
+                    'pennies': pennies,
+                    'category': categories[block]
+                })
+            
+            if not open_blocks:
+                break
         
-        return existing_transactions
+        return [transaction for block in blocks for transaction in block]
+
+    def build_duplicate_index(self):
+        """Index existing transactions by (date, description, pennies)"""
+        self.duplicate_index = set()
+        self.add_to_duplicate_index(self.existing_transactions)
+
+    def add_to_duplicate_index(self, transactions):
+        """Add transactions to the duplicate index"""
+        for transaction in transactions:
+            self.duplicate_index.add(duplicate_key(transaction['date'], transaction['description'], transaction['pennies']))
+
+    def toggle_ledger(self):
+        """Turn the ledger on or off from the checkbox"""
+        if self.jobs.busy:
+            # The running job may be using the ledger
+            self.ledger_var.set(self.use_ledger)
+            return
+        self.use_ledger = self.ledger_var.get()
+        if not self.use_ledger and self.ledger is not None:
+            self.ledger.close()
+            self.ledger = None
+
+    def reconcile_ledger(self):
+        """Make the ledger match a workbook that was edited by hand
+
+        The workbook wins: rows typed in are added, rows deleted are removed
+        and rows moved to another category block are recategorized.
+        """
+        recorded = Counter(self.ledger.transaction_keys())
+        missing = []
+        for transaction in self.load_existing_transactions(self.excel_path):
+            key = (*duplicate_key(transaction['date'], transaction['description'], transaction['pennies']),
+                   transaction['category'])
+            if recorded[key] > 0:
+                recorded[key] -= 1
+            else:
+                missing.append((key, transaction))
+        
+        # Ledger rows left over are no longer in the workbook, in the category they were saved under
+        stale = {}
+        for key, count in recorded.items():
+            stale.setdefault(key[:3], []).extend([key[3]] * count)
+        
+        added, moves = [], []
+        for key, transaction in missing:
+            categories = stale.get(key[:3])
+            if categories:
+                moves.append((*key[:3], categories.pop(), key[3]))
+            else:
+                added.append(transaction)
+        removed = [(*transaction_key, category)
+                   for transaction_key, categories in stale.items() for category in categories]
+        
+        if not (added or moves or removed):
+            return
+        try:
+            self.ledger.add_transactions(added, commit=False)
+            self.ledger.recategorize_transactions(moves, commit=False)
+            self.ledger.remove_transactions(removed, commit=False)
+        except Exception:
+            self.ledger.rollback()
+            raise
+        self.ledger.commit()
 
-    def is_duplicate(self, transaction):
-        """Check if a transaction is a duplicate"""
-        for existing in self.existing_transactions:
-            if (str(existing['date']) == str(transaction['date']) and
-                existing['description'] == transaction['description'] and
-                abs(existing['cost'] - transaction['cost']) < 0.01):  # Using small delta for float comparison
-                return True
-        return False
+    def open_ledger(self, excel_path):
+        """Open the ledger for a workbook, seeding it from the workbook on first use"""
+        if self.ledger is not None:
+            self.ledger.close()
+        self.ledger = TransactionLedger(TransactionLedger.path_for_workbook(excel_path))
+        if self.ledger.is_empty() and os.path.exists(excel_path):
+            self.ledger.add_transactions(self.load_existing_transactions(excel_path))
+
+    def duplicate_mask(self, df):
+        """Return a boolean array marking rows of df that are already recorded"""
+        if self.ledger is not None:
+            return self.ledger.duplicate_mask(df)
+        
+        mask = np.zeros(len(df), dtype=bool)
+        if not self.duplicate_index or df.empty:
+            return mask
+        
+        keys = pd.MultiIndex.from_arrays([
+            df['date'].astype(str).to_numpy(dtype=object),
+            normalise_descriptions(df['description']).to_numpy(dtype=object),
+            df['pennies'].astype('int64').to_numpy()
+        ])
+        return keys.isin(list(self.duplicate_index))
+
+    def normalise_import(self, df):
+        """Map a bank export onto date/description/pennies columns using column-wise operations only"""
+        profile = header_profile(df.columns)
+        
+        # Clean up data
+        df = df.replace([np.inf, -np.inf], np.nan)  # Replace infinite values with NaN
+        df = df.fillna(0)  # Replace NaN with 0 for numerical columns
+        
+        # Handle different formats
+        # Tesco credit card format
+        if 'Amount' in df.columns and 'Merchant' in df.columns:
+            # Handle Direct Debit payments - exclude them
+            direct_debit_mask = df['Merchant'].astype(str).str.contains('DIRECT DEBIT PAYMENT', case=False, na=False)
+            df = df[~direct_debit_mask.to_numpy()]
+            
+            # Positive amounts should be treated as costs (negative)
+            amount = pd.to_numeric(
+                df['Amount'].astype(str).str.replace('£', '', regex=False).str.replace(',', '', regex=False),
+                errors='coerce'
+            )
+            df = df.drop(columns=['Amount']).assign(cost=-amount.abs())
+            df = df.rename(columns={'Merchant': 'description'})
+        
+        # Handle other common column names
+        column_mappings = {
+            'Transaction Date': 'date',
+            'Trans Date': 'date',
+            'Date': 'date',
+            'Transaction Description': 'description',
+            'Description': 'description',
+            'Details': 'description',
+            'Merchant': 'description',
+            'Amount': 'cost',
+            'Value': 'cost',
+            'Billing Amount': 'cost',
+            'Transaction Amount': 'cost'
+        }
+        
+        # Use the first matching source column for each field
+        columns = {}
+        for target in ['date', 'description', 'cost']:
+            sources = [target] + [source for source, mapped in column_mappings.items() if mapped == target]
+            for source in sources:
+                if source in df.columns:
+                    columns[target] = df[source]
+                    break
+        
+        # Ensure required columns exist
+        required_columns = ['date', 'description', 'cost']
+        missing_columns = [col for col in required_columns if col not in columns]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+        
+        # Parse dates with one inferred format; rows that do not match become NaT
+        dates = parse_dates_for_profile(columns['date'], self.import_profiles, profile)
+        
+        # Clean up cost values
+        costs = columns['cost']
+        if not pd.api.types.is_numeric_dtype(costs):
+            # Remove currency symbols and commas, then convert to float
+            costs = costs.astype(str).str.replace('£', '', regex=False).str.replace(',', '', regex=False)
+        
+        return pd.DataFrame({
+            'date': dates.dt.strftime('%Y-%m-%d'),
+            'description': columns['description'].astype(str).str.strip(),
+            # Whole pennies from here on; floats only come back when writing Excel cells
+            'pennies': pennies_array(pd.to_numeric(costs, errors='coerce').fillna(0))
+        }).reset_index(drop=True)
+
+    def read_csv(self, file_path):
+        """Read a CSV export once, with the encoding sniffed from its first bytes
+
+        The encoding remembered for the export's format only decides between
+        the single-byte encodings when the file is not UTF-8.
+        """
+        profile = header_profile(csv_header_columns(file_path))
+        encoding = sniff_encoding(file_path, single_byte=self.import_profiles.get(profile, 'encoding'))
+        try:
+            df = pd.read_csv(file_path, encoding=encoding)
+        except UnicodeDecodeError:
+            # Invalid bytes past the sniffed prefix; latin1 accepts any byte, but
+            # is only used for this file and not remembered
+            return pd.read_csv(file_path, encoding='latin1')
+        if encoding in SINGLE_BYTE_ENCODINGS:
+            self.import_profiles.set(profile, 'encoding', encoding)
+        return df
+
+    def read_transactions_file(self, file_path):
+        """Read and normalise an export, reusing the cached result for identical file contents"""
+        cache_key = self.parse_cache.key(file_path, f'import:{IMPORT_VERSION}')
+        df = self.parse_cache.get(cache_key)
+        if df is not None:
+            return df
+        
+        # Load file based on extension
+        file_extension = os.path.splitext(file_path)[1].lower()
+        if file_extension in ['.xlsx', '.xls']:
+            df = pd.read_excel(file_path)
+        else:
+            df = self.read_csv(file_path)
+        
+        df = self.normalise_import(df)
+        self.parse_cache.put(cache_key, df)
+        return df
+
+    def start_job(self, name, work, on_done=None, on_error=None, on_cancelled=None):
+        """Run slow work in the background while the window stays responsive"""
+        for button in (self.file_button, self.save_button, self.rebuild_button):
+            button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_label.config(text=f"{name}...")
+        return self.jobs.submit(name, work, on_done, on_error, on_cancelled)
+
+    def show_job_progress(self, job, message):
+        """Show a job's progress, or re-enable the buttons once it has finished"""
+        if message is not None:
+            self.status_label.config(text=f"{job.name}: {message}")
+            return
+        for button in (self.file_button, self.save_button, self.rebuild_button):
+            button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="")
+
+    def cancel_job(self):
+        self.jobs.cancel()
+        self.status_label.config(text="Cancelling...")
 
     def load_file(self):
+        if self.jobs.busy:
+            return
+        
         file_path = filedialog.askopenfilename(
             filetypes=[
                 ("All supported files", "*.csv *.xlsx *.xls"),
@@ -196,167 +460,111 @@ class TransactionCategorizer:
             ]
         )
         if file_path:
-            try:
-                # First, ask for the Excel file to check duplicates against
-                excel_path = filedialog.askopenfilename(
-                    title="Select existing Excel file (Cancel if this is your first import)",
-                    filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
-                )
-                
-                if excel_path:
-                    self.excel_path = excel_path
-                    self.existing_transactions = self.load_existing_transactions(excel_path)
-                
-                # Load file based on extension
-                file_extension = os.path.splitext(file_path)[1].lower()
-                if file_extension in ['.xlsx', '.xls']:
-                    df = pd.read_excel(file_path)
-                else:  # Try CSV with different encodings
-                    try:
-                        df = pd.read_csv(file_path, encoding='utf-8-sig')
-                    except UnicodeDecodeError:
-                        try:
-                            df = pd.read_csv(file_path, encoding='latin1')
-                        except:
-                            df = pd.read_csv(file_path, encoding='cp1252')
-                
-                # Clean up data
-                df = df.replace([np.inf, -np.inf], np.nan)  # Replace infinite values with NaN
-                df = df.fillna(0)  # Replace NaN with 0 for numerical columns
-                
-                # Handle different formats
-                # Tesco credit card format
-                if 'Amount' in df.columns and 'Merchant' in df.columns:
-                    # Convert Amount to numeric, ensuring it's properly formatted
-                    df['Amount'] = pd.to_numeric(df['Amount'].astype(str).str.replace('£', '').str.replace(',', ''), errors='coerce')
-                    
-                    # Handle Direct Debit payments - exclude them
-                    direct_debit_mask = df['Merchant'].str.contains('DIRECT DEBIT PAYMENT', case=False, na=False)
-                    df = df[~direct_debit_mask]
-                    
-                    # For remaining transactions, positive amounts should be treated as costs (negative)
-                    df['cost'] = df['Amount'].apply(lambda x: -abs(x))
-                    
-                    # Map other columns
-                    if 'Date' in df.columns:
-                        df = df.rename(columns={'Date': 'date'})
-                    if 'Merchant' in df.columns:
-                        df = df.rename(columns={'Merchant': 'description'})
-                
-                # Handle other common column names
-                column_mappings = {
-                    'Transaction Date': 'date',
-                    'Trans Date': 'date',
-                    'Date': 'date',
-                    'Transaction Description': 'description',
-                    'Description': 'description',
-                    'Details': 'description',
-                    'Merchant': 'description',
-                    'Amount': 'cost',
-                    'Value': 'cost',
-                    'Billing Amount': 'cost',
-                    'Transaction Amount': 'cost'
-                }
-                
-                df = df.rename(columns=column_mappings)
-                
-                # Ensure required columns exist
-                required_columns = ['date', 'description', 'cost']
-                missing_columns = [col for col in required_columns if col not in df.columns]
-                if missing_columns:
-                    raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
-                
-                # Convert date strings to datetime with various formats
-                try:
-                    df['date'] = pd.to_datetime(df['date'], dayfirst=True)
-                except:
-                    try:
-                        # Try specific format if automatic parsing fails
-                        df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-                    except:
-                        # Try other common formats
-                        date_formats = ['%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%y']
-                        for fmt in date_formats:
-                            try:
-                                df['date'] = pd.to_datetime(df['date'], format=fmt)
-                                break
-                            except:
-                                continue
-                
-                df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-                
-                # Clean up description
-                df['description'] = df['description'].astype(str).str.strip()
-                
-                # Clean up cost values
-                if isinstance(df['cost'].iloc[0], str):
-                    # Remove currency symbols and commas, then convert to float
-                    df['cost'] = df['cost'].str.replace('£', '').str.replace(',', '')
-                df['cost'] = pd.to_numeric(df['cost'], errors='coerce').fillna(0)
-                
-                # Filter duplicates
-                filtered_transactions = []
-                duplicates_count = 0
-                
-                for _, row in df.iterrows():
-                    transaction = {
-                        'date': row['date'],
-                        'description': row['description'],
-                        'cost': float(row['cost'])
-                    }
-                    
-                    if not self.is_duplicate(transaction):
-                        filtered_transactions.append(transaction)
-                    else:
-                        duplicates_count += 1
-                
-                if duplicates_count > 0:
-                    messagebox.showinfo("Duplicates Found", 
-                                      f"{duplicates_count} duplicate transactions were found and skipped.")
-                
-                if not filtered_transactions:
-                    messagebox.showinfo("No New Transactions", 
-                                      "All transactions in the file are duplicates.")
-                    return
-                
-                self.transactions = pd.DataFrame(filtered_transactions)
-                self.current_index = 0
-                self.categorized_data = []
-                self.display_current_transaction()
-                self.update_pie_chart()
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Error loading file: {str(e)}")
-                # Print more detailed error information
-                import traceback
-                print(traceback.format_exc())
+            # First, ask for the Excel file to check duplicates against
+            excel_path = filedialog.askopenfilename(
+                title="Select existing Excel file (Cancel if this is your first import)",
+                filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+            )
+            if excel_path:
+                self.excel_path = excel_path
+            
+            self.start_job(
+                "Loading",
+                lambda job: self.read_new_transactions(file_path, excel_path, job),
+                on_done=self.show_new_transactions,
+                on_error=self.show_load_error
+            )
+
+    def read_new_transactions(self, file_path, excel_path, job):
+        """Read an export and drop rows with unrecognised dates or already recorded (background job)"""
+        if excel_path:
+            job.progress("Reading existing transactions")
+            if self.use_ledger:
+                self.open_ledger(excel_path)
+                # Check against the workbook as it is now, not as it was last saved
+                monthly_totals = MonthlyTotals(MonthlyTotals.path_for_workbook(excel_path))
+                if os.path.exists(excel_path) and not monthly_totals.is_current(self.totals_signature()):
+                    self.reconcile_ledger()
+            else:
+                self.existing_transactions = self.load_existing_transactions(excel_path)
+                self.build_duplicate_index()
+        
+        job.progress(f"Reading {os.path.basename(file_path)}")
+        df = self.read_transactions_file(file_path)
+        
+        # Skip rows whose date did not match the inferred format
+        invalid_dates = df['date'].isna()
+        invalid_count = int(invalid_dates.sum())
+        if invalid_count:
+            df = df[~invalid_dates].reset_index(drop=True)
+        
+        # Filter duplicates
+        job.progress("Checking for duplicates")
+        duplicate_mask = self.duplicate_mask(df)
+        duplicates_count = int(duplicate_mask.sum())
+        return df[~duplicate_mask].reset_index(drop=True), invalid_count, duplicates_count
+
+    def show_new_transactions(self, result):
+        filtered_transactions, invalid_count, duplicates_count = result
+        if invalid_count:
+            messagebox.showwarning("Unrecognised Dates",
+                                 f"{invalid_count} rows with unrecognised dates were skipped.")
+        
+        if duplicates_count > 0:
+            messagebox.showinfo("Duplicates Found", 
+                              f"{duplicates_count} duplicate transactions were found and skipped.")
+        
+        if filtered_transactions.empty:
+            if not duplicates_count:
+                message = "No transactions with recognised dates were found in the file."
+            elif invalid_count:
+                message = "Every transaction in the file is a duplicate or has an unrecognised date."
+            else:
+                message = "All transactions in the file are duplicates."
+            messagebox.showinfo("No New Transactions", message)
+            return
+        
+        self.session = CategorizationSession(filtered_transactions, self.categories.values())
+        self.current_index = 0
+        self.chart.reset()
+        self.display_current_transaction()
+        self.update_pie_chart()
+
+    def show_load_error(self, e):
+        messagebox.showerror("Error", f"Error loading file: {str(e)}")
+        # Print more detailed error information
+        import traceback
+        traceback.print_exception(type(e), e, e.__traceback__)
 
     def display_current_transaction(self):
-        if self.transactions is not None and self.current_index < len(self.transactions):
-            transaction = self.transactions.iloc[self.current_index]
-            self.date_label.config(text=f"Date: {transaction['date']}")
-            self.description_label.config(text=f"Description: {transaction['description']}")
-            self.cost_label.config(text=f"Amount: £{transaction['cost']:.2f}")
+        if self.session is not None and self.current_index < len(self.session):
+            date, description, pennies = self.session.row(self.current_index)
+            self.date_label.config(text=f"Date: {date}")
+            self.description_label.config(text=f"Description: {description}")
+            self.cost_label.config(text=f"Amount: £{pennies / 100:.2f}")
             
             # Update navigation buttons state
             self.prev_button.config(state=tk.NORMAL if self.current_index > 0 else tk.DISABLED)
-            self.next_button.config(state=tk.NORMAL if self.current_index < len(self.transactions) - 1 else tk.DISABLED)
+            self.next_button.config(state=tk.NORMAL if self.current_index < len(self.session) - 1 else tk.DISABLED)
     
     def categorize_transaction(self, category_key):
-        if self.transactions is not None and self.current_index < len(self.transactions):
-            transaction = self.transactions.iloc[self.current_index]
+        if self.session is not None and self.current_index < len(self.session):
+            if self.session.saved[self.current_index]:
+                self.status_label.config(text="This transaction has already been saved")
+                self.next_transaction()
+                return
+            date, _, pennies = self.session.row(self.current_index)
             category = self.categories.get(category_key, "Other")  # Default to "Other" if key not found
-            self.categorized_data.append({
-                'date': transaction['date'],
-                'description': transaction['description'],
-                'cost': transaction['cost'],
-                'category': category
-            })
+            # Re-categorizing replaces the earlier choice
+            previous = self.session.assign(self.current_index, category)
+            if previous is not None:
+                self.chart.remove(date, previous, pennies)
+            self.chart.add(date, category, pennies)
             self.next_transaction()
-            self.update_pie_chart()
+            self.redraw_scheduler.request()
     
     def next_transaction(self):
-        if self.current_index < len(self.transactions) - 1:
+        if self.current_index < len(self.session) - 1:
             self.current_index += 1
             self.display_current_transaction()
     
@@ -366,7 +574,11 @@ class TransactionCategorizer:
             self.display_current_transaction()
     
     def save_categorized_data(self):
-        if not self.categorized_data:
+        self.redraw_scheduler.flush()
+        if self.jobs.busy:
+            return
+        rows = self.session.pending() if self.session is not None else []
+        if not len(rows):
             messagebox.showwarning("Warning", "No categorized data to save!")
             return
         
@@ -378,145 +590,196 @@ class TransactionCategorizer:
             if not self.excel_path:
                 return
         
-        try:
-            # Convert new data to DataFrame
-            df = pd.DataFrame(self.categorized_data)
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.sort_values('date')
+        # Rows being saved are locked; the rest can still be categorized while the save runs
+        batch = self.session.frame(rows)
+        session = self.session
+        session.mark_saved(rows)
+        
+        def on_done(result):
+            messagebox.showinfo("Success", "Data appended successfully!")
             
-            # Create new workbook or load existing one
-            if os.path.exists(self.excel_path):
-                try:
-                    wb = openpyxl.load_workbook(self.excel_path)
-                except:
-                    # If file is corrupted, create new workbook
-                    wb = openpyxl.Workbook()
-            else:
+            # Update existing transactions list
+            if self.ledger is None:
+                transactions = batch.to_dict('records')
+                self.existing_transactions.extend(transactions)
+                self.add_to_duplicate_index(transactions)
+        
+        def on_error(e):
+            session.mark_saved(rows, False)
+            messagebox.showerror("Error", f"Error saving data: {str(e)}")
+        
+        def on_cancelled():
+            session.mark_saved(rows, False)
+            messagebox.showinfo("Cancelled", "Save cancelled, nothing was written.")
+        
+        self.start_job("Saving", lambda job: self.write_categorized_data(batch, job),
+                       on_done, on_error, on_cancelled)
+
+    def write_categorized_data(self, batch, job):
+        """Record categorized rows in the ledger and append them to the workbook (background job)"""
+        df = batch.copy()
+        df['date'] = pd.to_datetime(df['date'])
+        df = df.sort_values('date')
+        
+        if self.use_ledger and self.ledger is None:
+            self.open_ledger(self.excel_path)
+        
+        # Cached monthly totals are only reused if nothing changed since they were saved
+        monthly_totals = MonthlyTotals(MonthlyTotals.path_for_workbook(self.excel_path))
+        totals_current = monthly_totals.is_current(self.totals_signature())
+        
+        # A workbook changed outside the app may no longer match the ledger
+        if self.ledger is not None and not totals_current and os.path.exists(self.excel_path):
+            self.reconcile_ledger()
+        
+        # Record the new rows in the ledger before exporting them to Excel; they are
+        # only committed once the workbook has been saved
+        if self.ledger is not None:
+            self.ledger.add_frame(batch, commit=False)
+        try:
+            self.write_workbook(df, monthly_totals, totals_current, job)
+        except Exception:
+            if self.ledger is not None:
+                self.ledger.rollback()
+            raise
+        if self.ledger is not None:
+            self.ledger.commit()
+        monthly_totals.save(self.totals_signature())
+
+    def write_workbook(self, df, monthly_totals, totals_current, job):
+        """Append new rows to their month sheets and bring the dashboard up to date"""
+        job.progress("Opening workbook")
+        # Create new workbook or load existing one
+        if os.path.exists(self.excel_path):
+            try:
+                wb = openpyxl.load_workbook(self.excel_path)
+            except:
+                # If file is corrupted, create new workbook
                 wb = openpyxl.Workbook()
+        else:
+            wb = openpyxl.Workbook()
+        
+        # Remove default sheet if it exists and no data has been added to it
+        if 'Sheet' in wb.sheetnames and len(wb.sheetnames) > 1:
+            wb.remove(wb['Sheet'])
+        if 'Sheet1' in wb.sheetnames and len(wb.sheetnames) > 1:
+            wb.remove(wb['Sheet1'])
+        
+        styles.register_styles(wb)
+        tail_index = TailIndex(wb, len(self.categories))
+        
+        # Process new transactions by month
+        # Group by year and month
+        df['year_month'] = df['date'].dt.strftime('%Y-%m')
+        year_months = df['year_month'].unique()
+        for done, year_month in enumerate(year_months):
+            month_data = df[df['year_month'] == year_month]
+            sheet_name = month_data['date'].dt.strftime('%B %Y').iloc[0]
+            job.progress(f"Writing {sheet_name} ({done + 1}/{len(year_months)})")
             
-            # Remove default sheet if it exists and no data has been added to it
-            if 'Sheet' in wb.sheetnames and len(wb.sheetnames) > 1:
-                wb.remove(wb['Sheet'])
-            if 'Sheet1' in wb.sheetnames and len(wb.sheetnames) > 1:
-                wb.remove(wb['Sheet1'])
+            # Get or create worksheet
+            if sheet_name in wb.sheetnames:
+                ws = wb[sheet_name]
+            else:
+                ws = wb.create_sheet(sheet_name)
+                self.setup_worksheet_headers(ws)
             
-            # Process new transactions by month
-            # Group by year and month
-            df['year_month'] = df['date'].dt.strftime('%Y-%m')
-            for year_month in df['year_month'].unique():
-                month_data = df[df['year_month'] == year_month]
-                sheet_name = month_data['date'].dt.strftime('%B %Y').iloc[0]
+            # Append data after the last row of each category
+            for block, category in enumerate(self.categories.values()):
+                category_data = month_data[month_data['category'] == category]
+                if category_data.empty:
+                    continue
                 
-                # Get or create worksheet
-                if sheet_name in wb.sheetnames:
-                    ws = wb[sheet_name]
-                else:
-                    ws = wb.create_sheet(sheet_name)
-                    self.setup_worksheet_headers(ws)
+                category_col = block * 3 + 1
+                row = tail_index.next_row(ws, block)
                 
-                # Find last row for each category and append data
-                for category in self.categories.values():
-                    category_data = month_data[month_data['category'] == category]
-                    if category_data.empty:
-                        continue
-                    
-                    category_col = list(self.categories.values()).index(category) * 3 + 1
-                    row = 3
-                    
-                    # Find last row in this category
-                    while ws.cell(row=row, column=category_col).value is not None:
-                        row += 1
-                    
-                    # Append new data
-                    for _, transaction in category_data.iterrows():
-                        ws.cell(row=row, column=category_col, value=transaction['date'].strftime('%Y-%m-%d'))
-                        ws.cell(row=row, column=category_col+1, value=transaction['description'])
-                        cost_cell = ws.cell(row=row, column=category_col+2, value=transaction['cost'])
-                        cost_cell.number_format = '£#,##0.00'
-                        
-                        # Add borders
-                        for col in range(category_col, category_col+3):
-                            cell = ws.cell(row=row, column=col)
-                            cell.border = Border(
-                                left=Side(style='thin'),
-                                right=Side(style='thin'),
-                                top=Side(style='thin'),
-                                bottom=Side(style='thin')
-                            )
-                        
-                        # Add thick right border
-                        ws.cell(row=row, column=category_col+2).border = Border(
-                            left=Side(style='thin'),
-                            right=Side(style='thick'),
-                            top=Side(style='thin'),
-                            bottom=Side(style='thin')
-                        )
-                        
-                        row += 1
-            
-            # Save workbook
-            wb.save(self.excel_path)
-            messagebox.showinfo("Success", "Data appended successfully!")
-            
-            # Update existing transactions list
-            self.existing_transactions.extend(self.categorized_data)
+                # Append new data
+                category_data = category_data.assign(date=category_data['date'].dt.strftime('%Y-%m-%d'))
+                row = self.write_category_rows(ws, category_col, row, category_data.to_dict('records'))
+                tail_index.set_next_row(ws, block, row)
+        
+        # Bring the dashboard up to date with the new rows
+        if totals_current:
+            changed_months = monthly_totals.add(df)
+        else:
+            changed_months = monthly_totals.replace(self.collect_monthly_totals(wb))
+        self.create_dashboard(wb, monthly_totals, changed_months)
+        
+        # Save workbook; the last point at which the save can be cancelled
+        job.progress("Saving workbook")
+        tail_index.save()
+        wb.save(self.excel_path)
+
+    def rebuild_workbook(self):
+        """Regenerate every month sheet and the Dashboard from the ledger"""
+        if self.jobs.busy:
+            return
+        if not self.use_ledger:
+            messagebox.showwarning("Warning", "Turn on \"Use ledger\" to rebuild the workbook!")
+            return
+        
+        if not hasattr(self, 'excel_path'):
+            self.excel_path = filedialog.asksaveasfilename(
+                defaultextension=".xlsx",
+                filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+            )
+            if not self.excel_path:
+                return
+        
+        self.start_job(
+            "Rebuilding",
+            self.export_workbook,
+            on_done=lambda result: messagebox.showinfo("Success", "Workbook rebuilt successfully!"),
+            on_error=lambda e: messagebox.showerror("Error", f"Error rebuilding workbook: {str(e)}"),
+            on_cancelled=lambda: messagebox.showinfo("Cancelled", "Rebuild cancelled, the workbook was not changed.")
+        )
+
+    def export_workbook(self, job):
+        """Write the whole workbook from the ledger (background job)"""
+        # Checked before reconciling, which reads every other sheet as a month sheet
+        sheets = extra_sheets(self.excel_path)
+        if sheets:
+            raise ValueError(f"the workbook has sheets that are not rebuilt from the ledger: {', '.join(sheets)}")
+        if self.ledger is None:
+            self.open_ledger(self.excel_path)
+        
+        # Keep edits made to the workbook by hand
+        job.progress("Checking workbook rows")
+        if os.path.exists(self.excel_path):
+            self.reconcile_ledger()
+        
+        monthly_totals = MonthlyTotals(MonthlyTotals.path_for_workbook(self.excel_path))
+        monthly_totals.replace(self.collect_monthly_totals(None))
+        export_workbook(self.excel_path, self.ledger, self.categories.values(), monthly_totals, job.progress)
+        monthly_totals.save(self.totals_signature())
+
+    def write_category_rows(self, ws, category_col, row, transactions):
+        """Write transactions into a category block starting at the given row"""
+        for transaction in transactions:
+            ws.cell(row=row, column=category_col, value=transaction['date']).style = styles.TRANSACTION
+            ws.cell(row=row, column=category_col+1, value=transaction['description']).style = styles.TRANSACTION
+            # Currency format and thick right border
+            ws.cell(row=row, column=category_col+2, value=transaction['pennies'] / 100).style = styles.TRANSACTION_COST
             
-        except Exception as e:
-            messagebox.showerror("Error", f"Error saving data: {str(e)}")
+            row += 1
+        return row
 
     def setup_worksheet_headers(self, ws):
         """Set up headers for a new worksheet"""
-        # Define styles
-        header_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
-        header_font = Font(bold=True)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
         # Set up column headers
         current_col = 1
         for category in self.categories.values():
             # Category header
-            ws.cell(row=1, column=current_col, value=category)
-            ws.cell(row=1, column=current_col+1, value="")
-            ws.cell(row=1, column=current_col+2, value="")
+            ws.cell(row=1, column=current_col, value=category).style = styles.CATEGORY_HEADER
+            ws.cell(row=1, column=current_col+1, value="").style = styles.CATEGORY_HEADER
+            ws.cell(row=1, column=current_col+2, value="").style = styles.CATEGORY_HEADER_END
             
             # Subheaders
-            ws.cell(row=2, column=current_col, value="Date")
-            ws.cell(row=2, column=current_col+1, value="Description")
-            ws.cell(row=2, column=current_col+2, value="Cost")
-            
-            # Style headers
-            for col in range(current_col, current_col+3):
-                cell = ws.cell(row=1, column=col)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.border = border
-                cell = ws.cell(row=2, column=col)
-                cell.font = header_font
-                cell.border = border
-            
-            # Set currency format for cost column
-            for row in range(3, 1000):  # Pre-format a reasonable number of rows
-                ws.cell(row=row, column=current_col+2).number_format = '£#,##0.00'
-            
-            # Add right border to last column of each category
-            ws.cell(row=1, column=current_col+2).border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thick'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            ws.cell(row=2, column=current_col+2).border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thick'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
+            ws.cell(row=2, column=current_col, value="Date").style = styles.COLUMN_HEADER
+            ws.cell(row=2, column=current_col+1, value="Description").style = styles.COLUMN_HEADER
+            ws.cell(row=2, column=current_col+2, value="Cost").style = styles.COLUMN_HEADER_END
             
+            # Cost cells get their currency format when a transaction is written
             current_col += 3
         
         # Adjust column widths
@@ -524,190 +787,146 @@ class TransactionCategorizer:
             ws.column_dimensions[get_column_letter(col)].width = 15
     
     def update_pie_chart(self):
-        if not self.categorized_data:
-            return
-            
-        df = pd.DataFrame(self.categorized_data)
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Clear previous figure
-        if self.fig is not None:
-            plt.close(self.fig)
-        if self.canvas is not None:
-            self.canvas.get_tk_widget().destroy()
-        
-        # Create new figure
-        self.fig, self.ax = plt.subplots(figsize=(8, 6))
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self.right_frame)
-        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-        
-        # Trends Analysis
-        df['period'] = df['date'].dt.strftime('%Y-%m')
+        # Totals are kept up to date by categorize_transaction, so only the bars need redrawing
+        if self.chart.redraw():
+            self.fig.tight_layout()
+        self.canvas.draw_idle()
+
+    def totals_signature(self):
+        """Identify the workbook and ledger state the monthly totals cache was built from"""
+        try:
+            stat = os.stat(self.excel_path)
+            signature = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            signature = [None, None]
+        signature.append(self.ledger.last_id() if self.ledger is not None else None)
+        return signature
+
+    def collect_monthly_totals(self, wb):
+        """Total the pennies of every transaction by YYYY-MM month and category"""
+        totals = {}
+        if self.ledger is not None:
+            # Monthly totals come straight from the ledger
+            for month, category, total in self.ledger.monthly_totals():
+                totals.setdefault(month, {})[category] = total
+            return totals
+        
+        tail_index = TailIndex(wb, len(self.categories))
+        for sheet_name in wb.sheetnames:
+            if not TailIndex.is_month_sheet(sheet_name):
+                continue
         
-        # Create trends plot
-        sns.barplot(x='period', y='cost', hue='category', data=df, ax=self.ax)
-        self.ax.set_title('Monthly Income/Expenses')
-        self.ax.set_xlabel('Month')
-        self.ax.set_ylabel('Amount (£)')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
+            sheet = wb[sheet_name]
         
-        self.canvas.draw()
+            for block, category in enumerate(self.categories.values()):
+                current_col = block * 3 + 1
+                last_row = tail_index.next_row(sheet, block) - 1
+                if last_row < 3:
+                    continue
+                for date_value, _, cost in sheet.iter_rows(min_row=3, max_row=last_row,
+                                                           min_col=current_col, max_col=current_col + 2,
+                                                           values_only=True):
+                    if not date_value:
+                        break
+                
+                    if isinstance(date_value, str):
+                        try:
+                            date_value = datetime.strptime(date_value, '%Y-%m-%d')
+                        except ValueError:
+                            continue
+                    if not isinstance(date_value, datetime):
+                        continue
+                
+                    month_totals = totals.setdefault(date_value.strftime('%Y-%m'), {})
+                    month_totals[category] = month_totals.get(category, 0) + (to_pennies(cost) if cost is not None else 0)
+        return totals
 
-    def create_dashboard(self, wb):
-        """Create or update the dashboard sheet with monthly summaries"""
+    def create_dashboard(self, wb, monthly_totals=None, changed_months=None):
+        """Create or update the dashboard sheet with monthly summaries
+        
+        Only the rows of changed_months and the total row are rewritten, unless
+        the list of months on the sheet no longer matches the totals.
+        """
         sheet_name = "Dashboard"
+        if monthly_totals is None:
+            monthly_totals = MonthlyTotals(None)
+            changed_months = monthly_totals.replace(self.collect_monthly_totals(wb))
+        
+        months = monthly_totals.months()
+        if not months:
+            return
         
         # Check if dashboard exists
         if sheet_name in wb.sheetnames:
-            # Get existing dashboard
             ws = wb[sheet_name]
-            
-            # Only clear the data cells, not the entire sheet
-            for row in range(1, ws.max_row + 1):
-                for col in range(1, ws.max_column + 1):
-                    cell = ws.cell(row=row, column=col)
-                    if isinstance(cell.value, (int, float, str)):  # Only clear data cells
-                        cell.value = None
+            existing_labels = [value for (value,) in ws.iter_rows(min_row=2, max_col=1, values_only=True)]
         else:
             # Create new dashboard sheet
             ws = wb.create_sheet(sheet_name, 0)  # Add dashboard as first sheet
+            existing_labels = []
         
-        # Define styles
-        header_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
-        header_font = Font(bold=True)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Collect all transaction data
-        all_transactions = []
-        for sheet_name in wb.sheetnames:
-            if sheet_name == "Dashboard":
-                continue
-            
-            sheet = wb[sheet_name]
-            current_col = 1
-            
-            for category in self.categories.values():
-                row = 3
-                while True:
-                    date_cell = sheet.cell(row=row, column=current_col)
-                    if not date_cell.value:
-                        break
-                    
-                    cost_cell = sheet.cell(row=row, column=current_col + 2)
-                    
-                    if isinstance(date_cell.value, str):
-                        try:
-                            date_value = datetime.strptime(date_cell.value, '%Y-%m-%d')
-                        except ValueError:
-                            date_value = date_cell.value
-                    else:
-                        date_value = date_cell.value
-                    
-                    all_transactions.append({
-                        'date': date_value,
-                        'category': category,
-                        'cost': float(cost_cell.value) if cost_cell.value is not None else 0
-                    })
-                    row += 1
-                current_col += 3
-        
-        if not all_transactions:
-            return
-        
-        # Convert to DataFrame for easier analysis
-        df = pd.DataFrame(all_transactions)
-        df['date'] = pd.to_datetime(df['date'])
-        df['month'] = df['date'].dt.strftime('%B %Y')
+        styles.register_styles(wb)
+        categories = list(self.categories.values())
+        labels = [datetime.strptime(month, '%Y-%m').strftime('%B %Y') for month in months]
         
-        # Create monthly summary
         # Headers
-        ws.cell(row=1, column=1, value="Month")
-        current_col = 2
-        for category in self.categories.values():
-            ws.cell(row=1, column=current_col, value=category)
-            current_col += 1
-        ws.cell(row=1, column=current_col, value="Monthly Total")
+        ws.cell(row=1, column=1, value="Month").style = styles.CATEGORY_HEADER
+        for col, header in enumerate(categories + ["Monthly Total"], start=2):
+            ws.cell(row=1, column=col, value=header).style = styles.CATEGORY_HEADER
         
-        # Style headers
-        for col in range(1, current_col + 1):
-            cell = ws.cell(row=1, column=col)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
+        # Rows from the first month that is not already in place onwards are rewritten,
+        # before that only the months that changed
+        first_moved = 0
+        while first_moved < len(labels) and first_moved < len(existing_labels) \
+                and existing_labels[first_moved] == labels[first_moved]:
+            first_moved += 1
         
         # Monthly data
-        current_row = 2
-        monthly_summary = df.pivot_table(
-            index='month',
-            columns='category',
-            values='cost',
-            aggfunc='sum',
-            fill_value=0
-        )
-        
-        # Sort months chronologically
-        monthly_summary.index = pd.to_datetime(monthly_summary.index, format='%B %Y')
-        monthly_summary = monthly_summary.sort_index()
-        monthly_summary.index = monthly_summary.index.strftime('%B %Y')
-        
-        for month in monthly_summary.index:
-            ws.cell(row=current_row, column=1, value=month)
-            current_col = 2
-            row_total = 0
-            
-            for category in self.categories.values():
-                value = monthly_summary.loc[month, category] if category in monthly_summary.columns else 0
-                ws.cell(row=current_row, column=current_col, value=value)
-                row_total += value
-                current_col += 1
-            
-            ws.cell(row=current_row, column=current_col, value=row_total)
-            
-            # Add borders to row
-            for col in range(1, current_col + 1):
-                ws.cell(row=current_row, column=col).border = border
+        for index, (month, label) in enumerate(zip(months, labels)):
+            if index < first_moved and month not in changed_months:
+                continue
+            month_totals = monthly_totals.totals[month]
+            values = [month_totals.get(category, 0) for category in categories]
+            current_row = index + 2
             
-            current_row += 1
+            ws.cell(row=current_row, column=1, value=label).style = styles.TRANSACTION
+            for col, value in enumerate(values + [sum(values)], start=2):
+                ws.cell(row=current_row, column=col, value=value / 100).style = styles.AMOUNT
         
         # Add yearly totals
-        ws.cell(row=current_row, column=1, value="Year Total")
-        ws.cell(row=current_row, column=1).font = header_font
-        current_col = 2
-        year_total = 0
-        
-        for category in self.categories.values():
-            total = monthly_summary[category].sum() if category in monthly_summary.columns else 0
-            ws.cell(row=current_row, column=current_col, value=total)
-            year_total += total
-            current_col += 1
-        
-        ws.cell(row=current_row, column=current_col, value=year_total)
-        
-        # Style yearly totals row
-        for col in range(1, current_col + 1):
-            cell = ws.cell(row=current_row, column=col)
-            cell.font = header_font
-            cell.border = border
-        
-        # Format all numbers as currency
-        for row in range(2, current_row + 1):
-            for col in range(2, current_col + 1):
-                cell = ws.cell(row=row, column=col)
-                if isinstance(cell.value, (int, float)):
-                    cell.number_format = '£#,##0.00'
+        current_row = len(months) + 2
+        grid = np.array([[monthly_totals.totals[month].get(category, 0) for category in categories]
+                         for month in months], dtype=np.int64)
+        totals = grid.sum(axis=0).tolist()
+        ws.cell(row=current_row, column=1, value="Year Total").style = styles.COLUMN_HEADER
+        for col, total in enumerate(totals + [sum(totals)], start=2):
+            ws.cell(row=current_row, column=col, value=total / 100).style = styles.TOTAL_AMOUNT
+        
+        # Clear rows left over below the total row
+        if first_moved < len(labels) or existing_labels[len(labels):len(labels) + 1] != ["Year Total"]:
+            for row in ws.iter_rows(min_row=current_row + 1, max_row=ws.max_row):
+                for cell in row:
+                    cell.value = None
+                    cell.style = 'Normal'
         
         # Adjust column widths
-        for col in range(1, current_col + 1):
+        for col in range(1, len(categories) + 3):
             ws.column_dimensions[get_column_letter(col)].width = 15
 
     def on_closing(self):
         """Handle window closing event"""
+        if self.jobs.busy:
+            # Cancelling a save would throw the batch away, so close once the job and its
+            # messages are done; checked again with after so the Tk thread never blocks
+            if not self.closing:
+                self.closing = True
+                self.status_label.config(text="Closing once the current job has finished...")
+            self.root.after(100, self.on_closing)
+            return
+        self.jobs.shutdown()
+        self.redraw_scheduler.flush()
+        if self.ledger is not None:
+            self.ledger.close()
         if self.fig is not None:
             plt.close(self.fig)
         if hasattr(self, 'canvas') and self.canvas is not None:
@@ -0,0 +1,201 @@
+import codecs
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def normalise_description(description):
+    """Normalise a description for duplicate matching"""
+    return ' '.join(str(description).split()).upper()
+
+
+def normalise_descriptions(descriptions):
+    """Column-wise version of normalise_description for a pandas Series"""
+    return descriptions.astype(str).str.replace(r'\s+', ' ', regex=True).str.strip().str.upper()
+
+
+def to_pennies(cost):
+    """Round a cost to a whole number of pennies"""
+    return int(round(float(cost) * 100))
+
+
+def pennies_array(costs):
+    """Round an array of costs to int64 pennies"""
+    return np.rint(np.asarray(costs, dtype=float) * 100).astype(np.int64)
+
+
+def duplicate_key(date, description, pennies):
+    """Build the hashable key used by the duplicate index"""
+    return (str(date), normalise_description(description), int(pennies))
+
+
+SINGLE_BYTE_ENCODINGS = ('cp1252', 'latin1')
+
+
+def sniff_encoding(file_path, sample_size=64 * 1024, single_byte=None):
+    """Pick a text encoding for a CSV file from a bounded prefix of its bytes
+
+    BOMs and UTF-8 are always checked first. single_byte, if given, is the
+    encoding to use when the bytes are not UTF-8, instead of trying cp1252
+    and then latin1.
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    
+    try:
+        sample.decode('utf-8')
+        return 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still valid UTF-8
+        if e.reason == 'unexpected end of data' and len(sample) == sample_size:
+            return 'utf-8-sig'
+    
+    if single_byte in SINGLE_BYTE_ENCODINGS:
+        return single_byte
+    try:
+        sample.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+
+def csv_header_columns(file_path):
+    """Read the column names from the first line of a CSV file without decoding the rest"""
+    with open(file_path, 'rb') as f:
+        first_line = f.readline()
+    for bom in (codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+        if first_line.startswith(bom):
+            first_line = first_line[len(bom):]
+            break
+    return next(csv.reader([first_line.decode('latin1').strip()]), [])
+
+
+def header_profile(columns):
+    """Identify a bank export format by its column headings"""
+    header = '|'.join(str(column).strip() for column in columns)
+    return hashlib.sha1(header.encode('utf-8')).hexdigest()[:16]
+
+
+# Explicit formats tried when inferring how a date column is written
+DATE_FORMATS = [
+    '%d/%m/%Y',
+    '%d-%m-%Y',
+    '%Y-%m-%d',
+    '%d/%m/%y',
+    '%d-%m-%y',
+    '%d %b %Y',
+    '%d %B %Y',
+    '%d %b %y',
+    '%Y-%m-%d %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S'
+]
+
+
+def infer_date_format(values, sample_size=200):
+    """Pick the explicit format that parses the most values in a bounded sample"""
+    sample = pd.Series(values).dropna().astype(str).str.strip()
+    sample = sample[sample != ''].drop_duplicates().head(sample_size)
+    if sample.empty:
+        return None
+    
+    best_format, best_count = None, 0
+    for date_format in DATE_FORMATS:
+        count = pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum()
+        if count > best_count:
+            best_format, best_count = date_format, count
+            if count == len(sample):
+                break
+    return best_format
+
+
+def parse_dates(values, date_format):
+    """Parse a column with one explicit format; values that do not match become NaT"""
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if date_format is None:
+        return pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    values = values.astype(str).str.strip().str.replace(r'\s+', ' ', regex=True)
+    return pd.to_datetime(values, format=date_format, errors='coerce')
+
+
+def parse_mixed_dates(values):
+    """Parse dates written in no single listed format, one value at a time
+
+    ISO timestamps keep the date as written, ignoring any UTC offset; the
+    rest are parsed day first.
+    """
+    values = pd.Series(values).astype(str).str.strip()
+    values = values.str.replace(r'(?<=\d)(Z|[+-]\d{2}:?\d{2})$', '', regex=True)
+    dates = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    rest = dates.isna()
+    if rest.any():
+        dates[rest] = pd.to_datetime(values[rest], dayfirst=True, format='mixed', errors='coerce')
+    return dates
+
+
+def parse_dates_for_profile(values, profiles, profile):
+    """Parse a date column, reusing the format remembered for a source profile
+
+    Columns that no listed format fits are parsed value by value instead.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    
+    date_format = profiles.get(profile, 'date_format') if profiles is not None else None
+    dates = parse_dates(values, date_format) if date_format else None
+    if dates is None or (dates.isna().all() and not values.empty):
+        # No remembered format, or it no longer fits this source
+        date_format = infer_date_format(values)
+        if date_format is None:
+            return parse_mixed_dates(values)
+        dates = parse_dates(values, date_format)
+    
+    if profiles is not None and date_format is not None:
+        profiles.set(profile, 'date_format', date_format)
+    return dates
+
+
+class ImportProfiles:
+    """Per bank-format settings remembered between imports"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(os.path.expanduser('~'), '.transaction_categorizer_profiles.json')
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.profiles = json.load(f)
+        except (OSError, ValueError):
+            self.profiles = {}
+
+    def get(self, profile, setting):
+        return self.profiles.get(profile, {}).get(setting)
+
+    def set(self, profile, setting, value):
+        if self.get(profile, setting) == value:
+            return
+        # Pick up settings saved by other processes since this file was read
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.profiles = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self.profiles.setdefault(profile, {})[setting] = value
+        # Write a temporary file and swap it in, so readers never see a partial file
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.profiles, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
@@ -0,0 +1,145 @@
+import os
+from datetime import datetime
+from itertools import zip_longest
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+
+import styles
+from tail_index import INDEX_SHEET, INDEX_HEADER, FIRST_DATA_ROW
+
+
+def _styled(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def _set_widths(ws, columns):
+    for col in range(1, columns + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+
+
+def _sheet_name(month):
+    return datetime.strptime(month, '%Y-%m').strftime('%B %Y')
+
+
+def _is_month_name(sheet_name):
+    try:
+        datetime.strptime(sheet_name, '%B %Y')
+    except ValueError:
+        return False
+    return True
+
+
+def extra_sheets(excel_path):
+    """Return the non-empty sheets of an existing workbook that a rebuild would not write"""
+    if not os.path.exists(excel_path):
+        return []
+    wb = openpyxl.load_workbook(excel_path, read_only=True)
+    try:
+        return [ws.title for ws in wb.worksheets
+                if ws.title not in ("Dashboard", INDEX_SHEET) and not _is_month_name(ws.title)
+                and any(value is not None for values in ws.iter_rows(values_only=True) for value in values)]
+    finally:
+        wb.close()
+
+
+def write_dashboard(wb, monthly_totals, categories):
+    """Stream the Dashboard sheet: one row per month followed by the Year Total row"""
+    ws = wb.create_sheet("Dashboard")
+    _set_widths(ws, len(categories) + 2)
+    ws.append([_styled(ws, header, styles.CATEGORY_HEADER)
+               for header in ["Month"] + categories + ["Monthly Total"]])
+
+    year_totals = [0] * len(categories)
+    for month in monthly_totals.months():
+        values = [monthly_totals.totals[month].get(category, 0) for category in categories]
+        year_totals = [total + value for total, value in zip(year_totals, values)]
+        ws.append([_styled(ws, _sheet_name(month), styles.TRANSACTION)] +
+                  [_styled(ws, value / 100, styles.AMOUNT) for value in values + [sum(values)]])
+
+    ws.append([_styled(ws, "Year Total", styles.COLUMN_HEADER)] +
+              [_styled(ws, total / 100, styles.TOTAL_AMOUNT) for total in year_totals + [sum(year_totals)]])
+
+
+def write_month_sheet(wb, ledger, month, categories):
+    """Stream one month sheet and return the next free row of each category block"""
+    ws = wb.create_sheet(_sheet_name(month))
+    _set_widths(ws, len(categories) * 3)
+
+    header = []
+    subheader = []
+    for category in categories:
+        header += [_styled(ws, category, styles.CATEGORY_HEADER),
+                   _styled(ws, "", styles.CATEGORY_HEADER),
+                   _styled(ws, "", styles.CATEGORY_HEADER_END)]
+        subheader += [_styled(ws, "Date", styles.COLUMN_HEADER),
+                      _styled(ws, "Description", styles.COLUMN_HEADER),
+                      _styled(ws, "Cost", styles.COLUMN_HEADER_END)]
+    ws.append(header)
+    ws.append(subheader)
+
+    # Each row holds the next transaction of every category block, so the
+    # blocks are read side by side from one cursor per category
+    next_rows = [FIRST_DATA_ROW] * len(categories)
+    cursors = [ledger.iter_category_transactions(month, category) for category in categories]
+    for transactions in zip_longest(*cursors):
+        row = []
+        for block, transaction in enumerate(transactions):
+            if transaction is None:
+                row += [None, None, None]
+                continue
+            date, description, pennies = transaction
+            row += [_styled(ws, date, styles.TRANSACTION),
+                    _styled(ws, description, styles.TRANSACTION),
+                    _styled(ws, pennies / 100, styles.TRANSACTION_COST)]
+            next_rows[block] += 1
+        ws.append(row)
+    return ws.title, next_rows
+
+
+def export_workbook(excel_path, ledger, categories, monthly_totals, progress=None):
+    """Regenerate the whole workbook from the ledger using write-only worksheets.
+
+    Rows are streamed to disk as they are produced, so memory use does not
+    grow with the length of the history. progress, if given, is called with a
+    message before each month sheet; the file is only replaced at the end.
+    Raises ValueError rather than drop sheets that are not rebuilt from the
+    ledger.
+    """
+    sheets = extra_sheets(excel_path)
+    if sheets:
+        raise ValueError(f"the workbook has sheets that are not rebuilt from the ledger: {', '.join(sheets)}")
+    
+    categories = list(categories)
+    wb = openpyxl.Workbook(write_only=True)
+    styles.register_styles(wb)
+
+    write_dashboard(wb, monthly_totals, categories)
+    index_rows = []
+    months = ledger.months()
+    for done, month in enumerate(months):
+        if progress is not None:
+            progress(f"Writing {_sheet_name(month)} ({done + 1}/{len(months)})")
+        sheet_name, next_rows = write_month_sheet(wb, ledger, month, categories)
+        index_rows += [(sheet_name, block, row) for block, row in enumerate(next_rows)]
+
+    ws = wb.create_sheet(INDEX_SHEET)
+    ws.sheet_state = 'hidden'
+    ws.append(INDEX_HEADER)
+    for index_row in sorted(index_rows):
+        ws.append(list(index_row))
+
+    if progress is not None:
+        progress("Saving workbook")
+    # Write next to the workbook and swap it in, so a failed save leaves the old file
+    temp_path = excel_path + '.tmp'
+    try:
+        wb.save(temp_path)
+        os.replace(temp_path, excel_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise